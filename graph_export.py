@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+知识图谱子图导出
+按id集合、节点类型或层次根节点选择子图，流式写出为GraphML、JSON Lines或CSV
+
+节点和关系都通过驱动分块拉取（fetch_size），经生成器逐条写入文件，
+内存占用与子图大小无关。CSV格式与导入脚本使用的文件格式一致，可直接重新导入。
+"""
+
+import csv
+import json
+import logging
+import argparse
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("graphml", "jsonl", "csv")
+FETCH_SIZE = 1000
+NODE_FIELDS = ("id", "name", "description", "type")
+RELATIONSHIP_FIELDS = ("source_id", "target_id", "relationship_type", "description")
+HIERARCHY_REL_TYPES = "CONTAINS|INCLUDES"
+
+
+class SubgraphSelection:
+    """子图选择条件：id集合、节点类型、层次根节点，可组合使用（取交集）"""
+
+    def __init__(self, ids: Optional[List[str]] = None, types: Optional[List[str]] = None,
+                 root: Optional[str] = None, label: str = "KnowledgeNode"):
+        self.ids = list(ids) if ids else None
+        self.types = list(types) if types else None
+        self.root = root
+        self.label = label
+
+    @property
+    def parameters(self) -> Dict:
+        return {"ids": self.ids, "types": self.types, "root": self.root}
+
+    def _predicate(self, var: str) -> str:
+        """id集合与节点类型条件（根节点条件由匹配子句处理）"""
+        conditions = []
+        if self.ids:
+            conditions.append(f"{var}.id IN $ids")
+        if self.types:
+            conditions.append(f"{var}.type IN $types")
+        return " AND ".join(conditions) or "true"
+
+    def _subtree(self, var: str) -> str:
+        """从根节点沿层次关系展开一次的匹配子句"""
+        return f"MATCH (:{self.label} {{id: $root}})-[:{HIERARCHY_REL_TYPES}*0..]->({var}:{self.label})"
+
+    def nodes_query(self) -> str:
+        source = f"{self._subtree('n')} WITH DISTINCT n" if self.root else f"MATCH (n:{self.label})"
+        return f"""
+        {source}
+        WHERE {self._predicate('n')}
+        RETURN n.id AS id, n.name AS name, n.description AS description, n.type AS type
+        """
+
+    def relationships_query(self) -> str:
+        if self.root:
+            # 子树只展开一次并收集为集合，关系终点直接在集合中判断，
+            # 不再对每条候选关系从根节点做一次可变长度查找
+            return f"""
+            {self._subtree('n')}
+            WITH collect(DISTINCT n) AS subtree
+            UNWIND subtree AS a
+            WITH a, subtree
+            WHERE {self._predicate('a')}
+            MATCH (a)-[r]->(b:{self.label})
+            WHERE b IN subtree AND {self._predicate('b')}
+            RETURN a.id AS source_id, b.id AS target_id, type(r) AS relationship_type,
+                   r.description AS description
+            """
+        return f"""
+        MATCH (a:{self.label})
+        WHERE {self._predicate('a')}
+        MATCH (a)-[r]->(b:{self.label})
+        WHERE {self._predicate('b')}
+        RETURN a.id AS source_id, b.id AS target_id, type(r) AS relationship_type,
+               r.description AS description
+        """
+
+
+def stream_records(driver, query: str, parameters: Dict, fetch_size: int = FETCH_SIZE) -> Iterator[Dict]:
+    """分块读取查询结果，逐条产出记录"""
+    with driver.session(fetch_size=fetch_size) as session:
+        for record in session.run(query, parameters):
+            yield record.data()
+
+
+def write_jsonl(path: Path, nodes: Iterator[Dict], relationships: Iterator[Dict]) -> Tuple[int, int]:
+    """每行一个JSON对象，kind字段区分节点与关系"""
+    node_count = rel_count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for node in nodes:
+            f.write(json.dumps({"kind": "node", **node}, ensure_ascii=False) + "\n")
+            node_count += 1
+        for rel in relationships:
+            f.write(json.dumps({"kind": "relationship", **rel}, ensure_ascii=False) + "\n")
+            rel_count += 1
+    return node_count, rel_count
+
+
+def write_csv(path: Path, nodes: Iterator[Dict], relationships: Iterator[Dict]) -> Tuple[int, int]:
+    """写出 <name>_nodes.csv 与 <name>_relationships.csv，格式与导入文件一致"""
+    node_count = rel_count = 0
+    with open(path.with_name(path.stem + "_nodes.csv"), 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=NODE_FIELDS)
+        writer.writeheader()
+        for node in nodes:
+            writer.writerow(node)
+            node_count += 1
+    with open(path.with_name(path.stem + "_relationships.csv"), 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=RELATIONSHIP_FIELDS)
+        writer.writeheader()
+        for rel in relationships:
+            writer.writerow(rel)
+            rel_count += 1
+    return node_count, rel_count
+
+
+def write_graphml(path: Path, nodes: Iterator[Dict], relationships: Iterator[Dict]) -> Tuple[int, int]:
+    """写出GraphML，可用Gephi、yEd、networkx等工具读取"""
+    node_count = rel_count = 0
+
+    def data(key: str, value) -> str:
+        return "" if value is None else f'<data key="{key}">{escape(str(value))}</data>'
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+        for key in ("name", "description", "type"):
+            f.write(f'  <key id="n_{key}" for="node" attr.name="{key}" attr.type="string"/>\n')
+        for key in ("relationship_type", "description"):
+            f.write(f'  <key id="e_{key}" for="edge" attr.name="{key}" attr.type="string"/>\n')
+        f.write('  <graph id="G" edgedefault="directed">\n')
+        for node in nodes:
+            f.write(f'    <node id={quoteattr(str(node["id"]))}>'
+                    f'{data("n_name", node.get("name"))}{data("n_description", node.get("description"))}'
+                    f'{data("n_type", node.get("type"))}</node>\n')
+            node_count += 1
+        for rel in relationships:
+            f.write(f'    <edge source={quoteattr(str(rel["source_id"]))} target={quoteattr(str(rel["target_id"]))}>'
+                    f'{data("e_relationship_type", rel.get("relationship_type"))}'
+                    f'{data("e_description", rel.get("description"))}</edge>\n')
+            rel_count += 1
+        f.write('  </graph>\n</graphml>\n')
+    return node_count, rel_count
+
+
+WRITERS = {"graphml": write_graphml, "jsonl": write_jsonl, "csv": write_csv}
+
+
+def export_subgraph(driver, output: str, export_format: str, selection: SubgraphSelection,
+                    fetch_size: int = FETCH_SIZE) -> Tuple[int, int]:
+    """
+    导出子图
+
+    Args:
+        driver: Neo4j驱动
+        output: 输出文件路径（CSV格式会生成 _nodes.csv 和 _relationships.csv 两个文件）
+        export_format: graphml / jsonl / csv
+        selection: 子图选择条件
+        fetch_size: 每次从服务器拉取的记录数
+
+    Returns:
+        (导出的节点数, 导出的关系数)
+    """
+    if export_format not in WRITERS:
+        raise ValueError(f"不支持的导出格式: {export_format}，可选: {', '.join(EXPORT_FORMATS)}")
+
+    path = Path(output)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    parameters = selection.parameters
+    nodes = stream_records(driver, selection.nodes_query(), parameters, fetch_size)
+    relationships = stream_records(driver, selection.relationships_query(), parameters, fetch_size)
+
+    node_count, rel_count = WRITERS[export_format](path, nodes, relationships)
+    logger.info(f"子图已导出: {path} ({node_count}个节点, {rel_count}条关系)")
+    return node_count, rel_count
+
+
+def main():
+    """命令行入口"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="从Neo4j流式导出知识图谱子图")
+    parser.add_argument("-o", "--output", required=True, help="输出文件路径")
+    parser.add_argument("-f", "--format", choices=EXPORT_FORMATS, default="jsonl", help="导出格式")
+    parser.add_argument("--ids", nargs="+", help="按节点id选择")
+    parser.add_argument("--types", nargs="+", help="按节点type选择")
+    parser.add_argument("--root", help="导出该节点下的整个层次子树（CONTAINS/INCLUDES）")
+    parser.add_argument("--label", default="KnowledgeNode")
+    parser.add_argument("--fetch-size", type=int, default=FETCH_SIZE)
+    parser.add_argument("--uri", default="bolt://localhost:7687")
+    parser.add_argument("--username", default="neo4j")
+    parser.add_argument("--password", default="chenxingyu")
+    args = parser.parse_args()
+
+    from neo4j import GraphDatabase
+
+    driver = GraphDatabase.driver(args.uri, auth=(args.username, args.password))
+    try:
+        selection = SubgraphSelection(args.ids, args.types, args.root, args.label)
+        export_subgraph(driver, args.output, args.format, selection, args.fetch_size)
+    except Exception as e:
+        logger.error(f"导出失败: {e}")
+        return 1
+    finally:
+        driver.close()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+知识图谱二进制快照
+将节点表与CSR邻接结构保存为可内存映射的文件，供导入器、离线分析和本地测试快速加载
+
+快照目录结构:
+    meta.json          版本、节点/边数量、type与关系类型的字符串池、源CSV文件的哈希
+    nodes.arrow        节点表（id, name, description），Arrow IPC格式，未压缩以支持内存映射；
+                       列类型由数据推断（如CSV中的整数id保持为整数）
+    relationships.arrow  关系描述（description），顺序与出边CSR一致
+    node_type.npy      每个节点type在字符串池中的编号
+    out_indptr.npy     出边CSR行指针（长度为节点数+1）
+    out_indices.npy    出边目标节点编号
+    out_rel_type.npy   出边关系类型编号
+    in_indptr.npy / in_indices.npy / in_rel_type.npy   入边CSR
+"""
+
+import json
+import logging
+import argparse
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 3
+DEFAULT_SNAPSHOT_DIR = "graph_snapshot"
+
+
+class StringPool:
+    """字符串驻留池：相同字符串只保存一次，以整数编号引用"""
+
+    def __init__(self, strings: Optional[List[str]] = None):
+        self.strings: List[str] = list(strings or [])
+        self._index = {s: i for i, s in enumerate(self.strings)}
+
+    def intern(self, value) -> int:
+        value = "" if value is None else str(value)
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.strings)
+            self.strings.append(value)
+        return code
+
+    def __getitem__(self, code: int) -> str:
+        return self.strings[code]
+
+
+def _column(values: List) -> pa.Array:
+    """按数据推断Arrow列类型，混合类型时退化为字符串列"""
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+
+def _build_csr(num_nodes: int, src: np.ndarray, dst: np.ndarray,
+               rel_type: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """由边列表构建CSR结构（同一源节点的边保持输入顺序）
+
+    Returns:
+        (行指针, 目标节点编号, 关系类型编号, 各CSR位置对应的输入边下标)
+    """
+    order = np.argsort(src, kind="stable")
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=num_nodes), out=indptr[1:])
+    return indptr, dst[order].astype(np.int32), rel_type[order], order
+
+
+class GraphSnapshot:
+    """以内存映射方式加载的图快照"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        with open(self.path / "meta.json", 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"不支持的快照版本: {self.meta.get('version')}")
+
+        self.types = StringPool(self.meta["types"])
+        self.rel_types = StringPool(self.meta["rel_types"])
+
+        def load(name: str) -> np.ndarray:
+            return np.load(self.path / f"{name}.npy", mmap_mode="r")
+
+        self.node_type = load("node_type")
+        self.out_indptr, self.out_indices, self.out_rel_type = (
+            load("out_indptr"), load("out_indices"), load("out_rel_type"))
+        self.in_indptr, self.in_indices, self.in_rel_type = (
+            load("in_indptr"), load("in_indices"), load("in_rel_type"))
+
+        # Arrow IPC文件通过内存映射读取，列数据零拷贝
+        self._source = pa.memory_map(str(self.path / "nodes.arrow"), "r")
+        self.nodes: pa.Table = pa.ipc.open_file(self._source).read_all()
+        self._rel_source = pa.memory_map(str(self.path / "relationships.arrow"), "r")
+        self.relationships: pa.Table = pa.ipc.open_file(self._rel_source).read_all()
+        self._id_index: Optional[Dict[str, int]] = None
+
+    @property
+    def num_nodes(self) -> int:
+        return self.meta["num_nodes"]
+
+    @property
+    def num_edges(self) -> int:
+        return self.meta["num_edges"]
+
+    @property
+    def sources(self) -> Dict[str, str]:
+        """生成快照时记录的源文件哈希"""
+        return self.meta.get("sources") or {}
+
+    def index_of(self, node_id: str) -> Optional[int]:
+        """节点id -> 整数编号（首次调用时建立索引，按id的字符串形式匹配）"""
+        if self._id_index is None:
+            self._id_index = {str(v): i for i, v in enumerate(self.nodes.column("id").to_pylist())}
+        return self._id_index.get(str(node_id))
+
+    def node_id(self, index: int) -> str:
+        return self.nodes.column("id")[index].as_py()
+
+    def node(self, index: int) -> Dict:
+        """获取单个节点的全部字段"""
+        return {
+            "id": self.node_id(index),
+            "name": self.nodes.column("name")[index].as_py(),
+            "description": self.nodes.column("description")[index].as_py(),
+            "type": self.types[int(self.node_type[index])],
+        }
+
+    def out_edges(self, index: int) -> Iterable[Tuple[int, str]]:
+        """出边: (目标节点编号, 关系类型)"""
+        start, end = self.out_indptr[index], self.out_indptr[index + 1]
+        for target, rel in zip(self.out_indices[start:end], self.out_rel_type[start:end]):
+            yield int(target), self.rel_types[int(rel)]
+
+    def in_edges(self, index: int) -> Iterable[Tuple[int, str]]:
+        """入边: (源节点编号, 关系类型)"""
+        start, end = self.in_indptr[index], self.in_indptr[index + 1]
+        for source, rel in zip(self.in_indices[start:end], self.in_rel_type[start:end]):
+            yield int(source), self.rel_types[int(rel)]
+
+    def degree(self, index: int) -> int:
+        return int(self.out_indptr[index + 1] - self.out_indptr[index]
+                   + self.in_indptr[index + 1] - self.in_indptr[index])
+
+    def node_records(self) -> List[Dict]:
+        """全部节点（id, name, description, type），字段与导入用的节点CSV一致"""
+        ids = self.nodes.column("id").to_pylist()
+        names = self.nodes.column("name").to_pylist()
+        descriptions = self.nodes.column("description").to_pylist()
+        # 写入时None被驻留为空字符串，这里还原
+        types = [self.types[code] or None for code in self.node_type.tolist()]
+        return [{"id": i, "name": n, "description": d, "type": t}
+                for i, n, d, t in zip(ids, names, descriptions, types)]
+
+    def relationship_records(self) -> List[Dict]:
+        """全部关系（source_id, target_id, relationship_type, description），按出边CSR顺序"""
+        ids = self.nodes.column("id").to_pylist()
+        sources = np.repeat(np.arange(self.num_nodes), np.diff(self.out_indptr)).tolist()
+        descriptions = self.relationships.column("description").to_pylist()
+        return [{"source_id": ids[s], "target_id": ids[t],
+                 "relationship_type": self.rel_types[r], "description": d}
+                for s, t, r, d in zip(sources, self.out_indices.tolist(),
+                                      self.out_rel_type.tolist(), descriptions)]
+
+    @staticmethod
+    def write(path: str, nodes: Iterable[Dict], edges: Iterable[Tuple],
+              sources: Optional[Dict[str, str]] = None) -> Path:
+        """
+        写入快照
+
+        Args:
+            path: 快照目录
+            nodes: 节点字典（id, name, description, type）
+            edges: (源节点id, 目标节点id, 关系类型[, 关系描述])
+            sources: 源文件哈希，导入器据此判断快照能否代替CSV
+
+        Returns:
+            快照目录路径
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+
+        types, rel_types = StringPool(), StringPool()
+        ids, names, descriptions, type_codes = [], [], [], []
+        id_index: Dict[str, int] = {}
+        for node in nodes:
+            index = id_index.get(str(node["id"]))
+            if index is None:
+                id_index[str(node["id"])] = len(ids)
+                ids.append(node["id"])
+                names.append(node.get("name"))
+                descriptions.append(node.get("description"))
+                type_codes.append(types.intern(node.get("type")))
+            else:
+                # 与导入时逐行 MERGE + SET 的结果一致：重复id以最后一行为准
+                names[index] = node.get("name")
+                descriptions[index] = node.get("description")
+                type_codes[index] = types.intern(node.get("type"))
+
+        src, dst, rel_codes, rel_descriptions = [], [], [], []
+        skipped = 0
+        for edge in edges:
+            source_id, target_id, rel_type = edge[:3]
+            s, t = id_index.get(str(source_id)), id_index.get(str(target_id))
+            if s is None or t is None:
+                skipped += 1
+                continue
+            src.append(s)
+            dst.append(t)
+            rel_codes.append(rel_types.intern(rel_type))
+            rel_descriptions.append(edge[3] if len(edge) > 3 else None)
+        if skipped:
+            logger.warning(f"跳过 {skipped} 条端点不存在的关系")
+
+        num_nodes = len(ids)
+        src_arr = np.asarray(src, dtype=np.int64)
+        dst_arr = np.asarray(dst, dtype=np.int64)
+        rel_dtype = np.int16 if len(rel_types.strings) < 2 ** 15 else np.int32
+        rel_arr = np.asarray(rel_codes, dtype=rel_dtype)
+        type_dtype = np.int16 if len(types.strings) < 2 ** 15 else np.int32
+
+        arrays = {"node_type": np.asarray(type_codes, dtype=type_dtype)}
+        arrays["out_indptr"], arrays["out_indices"], arrays["out_rel_type"], out_order = _build_csr(
+            num_nodes, src_arr, dst_arr, rel_arr)
+        arrays["in_indptr"], arrays["in_indices"], arrays["in_rel_type"], _ = _build_csr(
+            num_nodes, dst_arr, src_arr, rel_arr)
+        for name, array in arrays.items():
+            np.save(path / f"{name}.npy", array)
+
+        table = pa.table({
+            "id": _column(ids),
+            "name": _column(names),
+            "description": _column(descriptions),
+        })
+        rel_table = pa.table({
+            "description": _column([rel_descriptions[i] for i in out_order.tolist()]),
+        })
+        for name, data in (("nodes", table), ("relationships", rel_table)):
+            with pa.OSFile(str(path / f"{name}.arrow"), "wb") as sink:
+                with pa.ipc.new_file(sink, data.schema) as writer:
+                    writer.write_table(data)
+
+        meta = {
+            "version": SNAPSHOT_VERSION,
+            "num_nodes": num_nodes,
+            "num_edges": len(src),
+            "types": types.strings,
+            "rel_types": rel_types.strings,
+            "sources": sources or {},
+        }
+        with open(path / "meta.json", 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+        logger.info(f"快照已写入: {path} ({num_nodes}个节点, {len(src)}条关系)")
+        return path
+
+    @staticmethod
+    def from_csv(nodes_file: str, relationships_file: str, path: str = DEFAULT_SNAPSHOT_DIR) -> Path:
+        """由导入使用的CSV文件生成快照"""
+        import pandas as pd
+
+        nodes_df = pd.read_csv(nodes_file, encoding='utf-8')
+        relationships_df = pd.read_csv(relationships_file, encoding='utf-8')
+        nodes_df = nodes_df.astype(object).where(nodes_df.notna(), None)
+        relationships_df = relationships_df.astype(object).where(relationships_df.notna(), None)
+
+        return GraphSnapshot.write(
+            path,
+            nodes_df[['id', 'name', 'description', 'type']].to_dict('records'),
+            relationships_df[['source_id', 'target_id', 'relationship_type', 'description']].itertuples(
+                index=False, name=None),
+        )
+
+    @staticmethod
+    def from_neo4j(driver, path: str = DEFAULT_SNAPSHOT_DIR, label: str = "KnowledgeNode") -> Path:
+        """从Neo4j数据库导出快照（结果逐条读取后直接写入快照，不保留中间记录列表）"""
+        with driver.session() as session:
+            def nodes() -> Iterator[Dict]:
+                for record in session.run(f"""
+                    MATCH (n:{label})
+                    RETURN n.id AS id, n.name AS name, n.description AS description, n.type AS type
+                """):
+                    yield record.data()
+
+            def edges() -> Iterator[Tuple]:
+                for record in session.run(f"""
+                    MATCH (a:{label})-[r]->(b:{label})
+                    RETURN a.id AS source_id, b.id AS target_id, type(r) AS relationship_type,
+                           r.description AS description
+                """):
+                    yield tuple(record.values())
+
+            # write先读完全部节点再读取关系，同一会话中不会有两个结果同时打开
+            return GraphSnapshot.write(path, nodes(), edges())
+
+
+def main():
+    """命令行入口：由CSV或Neo4j生成快照，或查看已有快照"""
+    parser = argparse.ArgumentParser(description="知识图谱二进制快照工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    csv_parser = subparsers.add_parser("from-csv", help="由CSV文件生成快照")
+    csv_parser.add_argument("--nodes", default="knowledge_graph_nodes.csv")
+    csv_parser.add_argument("--relationships", default="knowledge_graph_relationships.csv")
+    csv_parser.add_argument("-o", "--output", default=DEFAULT_SNAPSHOT_DIR)
+
+    neo4j_parser = subparsers.add_parser("from-neo4j", help="从Neo4j导出快照")
+    neo4j_parser.add_argument("--uri", default="bolt://localhost:7687")
+    neo4j_parser.add_argument("--username", default="neo4j")
+    neo4j_parser.add_argument("--password", default="chenxingyu")
+    neo4j_parser.add_argument("--label", default="KnowledgeNode")
+    neo4j_parser.add_argument("-o", "--output", default=DEFAULT_SNAPSHOT_DIR)
+
+    info_parser = subparsers.add_parser("info", help="查看快照信息")
+    info_parser.add_argument("path", nargs="?", default=DEFAULT_SNAPSHOT_DIR)
+
+    args = parser.parse_args()
+
+    if args.command == "from-csv":
+        GraphSnapshot.from_csv(args.nodes, args.relationships, args.output)
+    elif args.command == "from-neo4j":
+        from neo4j import GraphDatabase
+
+        driver = GraphDatabase.driver(args.uri, auth=(args.username, args.password))
+        try:
+            GraphSnapshot.from_neo4j(driver, args.output, args.label)
+        finally:
+            driver.close()
+    else:
+        snapshot = GraphSnapshot(args.path)
+        logger.info(f"快照: {snapshot.path}")
+        logger.info(f"- 节点数: {snapshot.num_nodes}")
+        logger.info(f"- 关系数: {snapshot.num_edges}")
+        logger.info(f"- 节点类型: {len(snapshot.types.strings)} 种")
+        logger.info(f"- 关系类型: {', '.join(snapshot.rel_types.strings)}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
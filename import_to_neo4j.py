@@ -6,19 +6,195 @@ Author: Assistant
 Date: 2024
 """
 
+import os
+import json
+import time
+import hashlib
+import argparse
+import contextlib
 import pandas as pd
 from neo4j import GraphDatabase
+from neo4j.exceptions import ClientError
 import logging
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
+
+from perf_stats import percentile
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def file_sha256(path: str) -> str:
+    """计算文件的SHA-256（流式读取）"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+PROCEDURE_NOT_FOUND = "Neo.ClientError.Procedure.ProcedureNotFound"
+
+SUMMARY_COUNTERS = (
+    "nodes_created", "nodes_deleted", "relationships_created", "relationships_deleted",
+    "properties_set", "labels_added", "indexes_added", "constraints_added",
+)
+
+class ImportProfiler:
+    """导入过程计时：记录各阶段耗时、批次延迟、吞吐量及服务端计数器"""
+    
+    def __init__(self):
+        self.started_at = time.time()
+        self.phases: Dict[str, Dict[str, Any]] = {}
+    
+    def _phase(self, name: str) -> Dict[str, Any]:
+        return self.phases.setdefault(name, {
+            "seconds": 0.0, "rows": 0, "batches": [], "subphases": {},
+            "counters": {key: 0 for key in SUMMARY_COUNTERS},
+        })
+    
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """统计一个阶段的总耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._phase(name)["seconds"] += time.perf_counter() - start
+    
+    @contextlib.contextmanager
+    def subphase(self, phase: str, name: str):
+        """统计阶段内某一步骤（如CSV解析、批次数据构造）的累计耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            subphases = self._phase(phase)["subphases"]
+            subphases[name] = subphases.get(name, 0.0) + time.perf_counter() - start
+    
+    def record_summary(self, phase: str, summary):
+        """累加结果摘要中的服务端计数器"""
+        counters = getattr(summary, "counters", None)
+        if counters is None:
+            return
+        totals = self._phase(phase)["counters"]
+        for key in SUMMARY_COUNTERS:
+            totals[key] += getattr(counters, key, 0) or 0
+    
+    def record_batch(self, phase: str, rows: int, seconds: float):
+        data = self._phase(phase)
+        data["rows"] += rows
+        data["batches"].append(seconds)
+    
+    def rows_per_second(self, phase: str) -> float:
+        data = self._phase(phase)
+        busy = sum(data["batches"])
+        return data["rows"] / busy if busy else 0.0
+    
+    def eta(self, phase: str, remaining_rows: int) -> float:
+        """按当前吞吐量估计剩余秒数"""
+        rate = self.rows_per_second(phase)
+        return remaining_rows / rate if rate else 0.0
+    
+    def report(self) -> Dict[str, Any]:
+        """生成机器可读的报告"""
+        phases = {}
+        for name, data in self.phases.items():
+            batches = data["batches"]
+            phases[name] = {
+                "seconds": round(data["seconds"], 4),
+                "rows": data["rows"],
+                "batches": len(batches),
+                "rows_per_second": round(self.rows_per_second(name), 2),
+                "batch_latency_p50_ms": round(percentile(batches, 50) * 1000, 2),
+                "batch_latency_p99_ms": round(percentile(batches, 99) * 1000, 2),
+                "batch_latency_max_ms": round(max(batches) * 1000, 2) if batches else 0.0,
+                "subphases_seconds": {k: round(v, 4) for k, v in data["subphases"].items()},
+                "server_counters": {k: v for k, v in data["counters"].items() if v},
+            }
+        return {
+            "started_at": self.started_at,
+            "total_seconds": round(time.time() - self.started_at, 4),
+            "phases": phases,
+        }
+    
+    def write_report(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        logger.info(f"导入性能报告已写入: {path}")
+    
+    def log_summary(self):
+        logger.info("导入性能统计:")
+        for name, data in self.report()["phases"].items():
+            line = f"  {name}: {data['seconds']:.2f}s"
+            if data["batches"]:
+                line += (f", {data['rows']}行, {data['rows_per_second']:.0f}行/秒, "
+                         f"批次p50 {data['batch_latency_p50_ms']:.1f}ms / p99 {data['batch_latency_p99_ms']:.1f}ms")
+            if data["subphases_seconds"]:
+                line += ", " + ", ".join(f"{k} {v:.2f}s" for k, v in data["subphases_seconds"].items())
+            logger.info(line)
+
+class ImportCheckpoint:
+    """导入断点记录：保存每个阶段已提交的行数及源文件哈希"""
+    
+    # 阶段按执行顺序排列，后面的阶段依赖前面阶段的结果
+    PHASES = ("nodes", "relationships", "hierarchy")
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.state: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+    
+    def save(self):
+        """原子写入状态文件，避免中断时留下损坏的文件"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+    
+    def reset(self):
+        self.state = {}
+        self.save()
+    
+    def start(self, phase: str, source_file: Optional[str] = None, reader: str = "csv") -> int:
+        """
+        开始一个阶段，返回应跳过的已提交行数
+        
+        源文件内容或读取方式（CSV/快照，两者的行顺序不同）变化时丢弃该阶段的断点，从头开始；
+        依赖该阶段的后续阶段（如关系重导后的层次关系改写）也随之失效。
+        """
+        file_hash = file_sha256(source_file) if source_file else None
+        entry = self.state.get(phase)
+        if entry and entry.get("sha256") == file_hash and entry.get("reader", "csv") == reader:
+            return entry.get("committed_rows", 0)
+        if entry:
+            logger.warning(f"{phase} 的源文件或读取方式已变化，忽略断点从头导入")
+        self.state[phase] = {"file": source_file, "sha256": file_hash, "reader": reader,
+                             "committed_rows": 0, "done": False}
+        if phase in self.PHASES:
+            for later in self.PHASES[self.PHASES.index(phase) + 1:]:
+                if self.state.pop(later, None) is not None:
+                    logger.warning(f"{phase} 从头导入，{later} 的断点一并失效")
+        self.save()
+        return 0
+    
+    def commit(self, phase: str, committed_rows: int):
+        self.state[phase]["committed_rows"] = committed_rows
+        self.save()
+    
+    def complete(self, phase: str):
+        self.state.setdefault(phase, {})["done"] = True
+        self.save()
+    
+    def is_done(self, phase: str) -> bool:
+        return self.state.get(phase, {}).get("done", False)
+
 class Neo4jImporter:
     """Neo4j数据导入类"""
     
-    def __init__(self, uri: str, username: str, password: str):
+    def __init__(self, uri: str, username: str, password: str,
+                 checkpoint: Optional[ImportCheckpoint] = None):
         """
         初始化Neo4j连接
         
@@ -26,10 +202,95 @@ class Neo4jImporter:
             uri: Neo4j数据库URI (例如: "bolt://localhost:7687")
             username: 用户名 (默认: "neo4j")
             password: 密码
+            checkpoint: 断点记录，提供时每个批次提交后都会更新
         """
         self.driver = GraphDatabase.driver(uri, auth=(username, password))
+        self.checkpoint = checkpoint
+        self.profiler = ImportProfiler()
+        # 待导入的节点/关系记录及其来源（"csv" 或 "snapshot"），导入结束后据此生成快照
+        self.records: Dict[str, List[Dict]] = {}
+        self.reader = "csv"
+        self.sources: Dict[str, str] = {}
         logger.info(f"成功连接到Neo4j数据库: {uri}")
     
+    def _start_phase(self, phase: str, source_file: Optional[str] = None) -> int:
+        return self.checkpoint.start(phase, source_file, self.reader) if self.checkpoint else 0
+    
+    def _read_csv(self, phase: str, path: str) -> List[Dict]:
+        """解析CSV为记录列表，空值统一为None（与快照读出的记录一致）"""
+        with self.profiler.subphase(phase, "parse"):
+            df = pd.read_csv(path, encoding='utf-8')
+            return df.astype(object).where(df.notna(), None).to_dict('records')
+    
+    def load_records(self, nodes_file: str, relationships_file: str, snapshot_dir: str) -> str:
+        """
+        读取待导入的节点和关系
+        
+        快照中记录的源文件哈希与当前CSV一致时直接从快照加载（内存映射，不解析CSV），
+        否则解析CSV。
+        
+        Returns:
+            数据来源："snapshot" 或 "csv"
+        """
+        self.sources = {"nodes": file_sha256(nodes_file), "relationships": file_sha256(relationships_file)}
+        try:
+            from graph_snapshot import GraphSnapshot
+            with self.profiler.subphase("load", "snapshot"):
+                snapshot = GraphSnapshot(snapshot_dir)
+                if snapshot.sources == self.sources:
+                    self.records = {"nodes": snapshot.node_records(),
+                                    "relationships": snapshot.relationship_records()}
+                    self.reader = "snapshot"
+                    logger.info(f"快照与CSV一致，从快照加载: {snapshot_dir}")
+                    return self.reader
+            logger.info("快照与CSV不一致，改为解析CSV")
+        except Exception as e:
+            logger.info(f"未使用快照（{e}），解析CSV")
+        
+        self.records = {"nodes": self._read_csv("load", nodes_file),
+                        "relationships": self._read_csv("load", relationships_file)}
+        self.reader = "csv"
+        return self.reader
+    
+    def write_snapshot(self, snapshot_dir: str):
+        """用本次导入的记录生成快照（记录即来自同一份快照时跳过）"""
+        if self.reader == "snapshot":
+            logger.info("快照已是最新，无需重新生成")
+            return
+        if "nodes" not in self.records or "relationships" not in self.records:
+            logger.warning("缺少节点或关系记录，跳过生成快照")
+            return
+        from graph_snapshot import GraphSnapshot
+        GraphSnapshot.write(
+            snapshot_dir,
+            self.records["nodes"],
+            ((r['source_id'], r['target_id'], r['relationship_type'], r['description'])
+             for r in self.records["relationships"]),
+            self.sources,
+        )
+    
+    def _commit_batch(self, phase: str, committed_rows: int):
+        if self.checkpoint:
+            self.checkpoint.commit(phase, committed_rows)
+    
+    def _complete_phase(self, phase: str):
+        if self.checkpoint:
+            self.checkpoint.complete(phase)
+    
+    def _write_batch(self, session, phase: str, query: str, **parameters):
+        """在托管事务中写入一个批次并记录服务端计数器"""
+        with self.profiler.subphase(phase, "write"):
+            summary = session.execute_write(lambda tx: tx.run(query, **parameters).consume())
+        self.profiler.record_summary(phase, summary)
+        return summary
+    
+    def _log_batch(self, phase: str, label: str, batch_num: int, total_batches: int,
+                   rows: int, seconds: float, remaining_rows: int):
+        self.profiler.record_batch(phase, rows, seconds)
+        logger.info(f"已导入{label}批次 {batch_num}/{total_batches} ({rows}个{label}, {seconds * 1000:.0f}ms, "
+                    f"{self.profiler.rows_per_second(phase):.0f}行/秒, "
+                    f"预计剩余 {self.profiler.eta(phase, remaining_rows):.0f}s)")
+    
     def close(self):
         """关闭数据库连接"""
         if self.driver:
@@ -66,44 +327,50 @@ class Neo4jImporter:
             nodes_file: 节点CSV文件路径
         """
         try:
-            # 读取CSV文件
-            nodes_df = pd.read_csv(nodes_file, encoding='utf-8')
-            logger.info(f"成功读取节点文件: {nodes_file}, 共{len(nodes_df)}个节点")
+            # 未预先加载（load_records）时直接读取CSV文件
+            nodes = self.records.get("nodes")
+            if nodes is None:
+                nodes = self.records["nodes"] = self._read_csv("nodes", nodes_file)
+            logger.info(f"成功读取节点: {nodes_file}（来源: {self.reader}）, 共{len(nodes)}个节点")
             
-            # 批量导入节点
+            # 批量导入节点（从断点处继续）
             batch_size = 100
-            total_batches = (len(nodes_df) + batch_size - 1) // batch_size
+            total_batches = (len(nodes) + batch_size - 1) // batch_size
+            start_row = self._start_phase("nodes", nodes_file)
+            if start_row:
+                logger.info(f"从断点继续：跳过已提交的 {start_row} 个节点")
+            
+            # MERGE保证批次可重复执行（重试或断点续传时不会产生重复节点）
+            query = """
+            UNWIND $nodes_data AS node
+            MERGE (n:KnowledgeNode {id: node.id})
+            SET n.name = node.name,
+                n.description = node.description,
+                n.type = node.type
+            """
             
             with self.driver.session() as session:
-                for i in range(0, len(nodes_df), batch_size):
-                    batch = nodes_df[i:i + batch_size]
+                for i in range(start_row, len(nodes), batch_size):
+                    batch_start = time.perf_counter()
                     batch_num = i // batch_size + 1
                     
                     # 准备批次数据
-                    nodes_data = []
-                    for _, row in batch.iterrows():
-                        nodes_data.append({
+                    with self.profiler.subphase("nodes", "build"):
+                        nodes_data = [{
                             'id': row['id'],
                             'name': row['name'],
                             'description': row['description'],
                             'type': row['type']
-                        })
-                    
-                    # 执行批量插入
-                    query = """
-                    UNWIND $nodes_data AS node
-                    CREATE (n:KnowledgeNode {
-                        id: node.id,
-                        name: node.name,
-                        description: node.description,
-                        type: node.type
-                    })
-                    """
+                        } for row in nodes[i:i + batch_size]]
                     
-                    session.run(query, nodes_data=nodes_data)
-                    logger.info(f"已导入节点批次 {batch_num}/{total_batches} ({len(batch)}个节点)")
+                    # 托管事务在网络抖动等瞬时错误时自动重试
+                    self._write_batch(session, "nodes", query, nodes_data=nodes_data)
+                    self._commit_batch("nodes", i + len(nodes_data))
+                    self._log_batch("nodes", "节点", batch_num, total_batches, len(nodes_data),
+                                    time.perf_counter() - batch_start, len(nodes) - i - len(nodes_data))
             
-            logger.info(f"所有节点导入完成！总计{len(nodes_df)}个节点")
+            self._complete_phase("nodes")
+            logger.info(f"所有节点导入完成！总计{len(nodes)}个节点")
             
         except Exception as e:
             logger.error(f"导入节点时发生错误: {e}")
@@ -117,60 +384,75 @@ class Neo4jImporter:
             relationships_file: 关系CSV文件路径
         """
         try:
-            # 读取CSV文件
-            relationships_df = pd.read_csv(relationships_file, encoding='utf-8')
-            logger.info(f"成功读取关系文件: {relationships_file}, 共{len(relationships_df)}个关系")
+            # 未预先加载（load_records）时直接读取CSV文件
+            relationships = self.records.get("relationships")
+            if relationships is None:
+                relationships = self.records["relationships"] = self._read_csv("relationships", relationships_file)
+            logger.info(f"成功读取关系: {relationships_file}（来源: {self.reader}）, 共{len(relationships)}个关系")
             
-            # 批量导入关系
+            # 批量导入关系（从断点处继续）
             batch_size = 100
-            total_batches = (len(relationships_df) + batch_size - 1) // batch_size
+            total_batches = (len(relationships) + batch_size - 1) // batch_size
+            start_row = self._start_phase("relationships", relationships_file)
+            if start_row:
+                logger.info(f"从断点继续：跳过已提交的 {start_row} 个关系")
+            
+            # 使用MERGE保证批次可重复执行
+            query = """
+            UNWIND $relationships_data AS rel
+            MATCH (source:KnowledgeNode {id: rel.source_id})
+            MATCH (target:KnowledgeNode {id: rel.target_id})
+            CALL apoc.merge.relationship(source, rel.relationship_type, {}, {
+                description: rel.description
+            }, target, {}) YIELD rel as relationship
+            RETURN count(relationship)
+            """
+            
+            # 如果没有APOC插件，使用基础语法
+            fallback_query = """
+            UNWIND $relationships_data AS rel
+            MATCH (source:KnowledgeNode {id: rel.source_id})
+            MATCH (target:KnowledgeNode {id: rel.target_id})
+            MERGE (source)-[r:RELATED {type: rel.relationship_type}]->(target)
+            SET r.description = rel.description
+            """
+            use_apoc = True
             
             with self.driver.session() as session:
-                for i in range(0, len(relationships_df), batch_size):
-                    batch = relationships_df[i:i + batch_size]
+                for i in range(start_row, len(relationships), batch_size):
+                    batch_start = time.perf_counter()
                     batch_num = i // batch_size + 1
                     
                     # 准备批次数据
-                    relationships_data = []
-                    for _, row in batch.iterrows():
-                        relationships_data.append({
+                    with self.profiler.subphase("relationships", "build"):
+                        relationships_data = [{
                             'source_id': row['source_id'],
                             'target_id': row['target_id'],
                             'relationship_type': row['relationship_type'],
                             'description': row['description']
-                        })
-                    
-                    # 执行批量创建关系
-                    query = """
-                    UNWIND $relationships_data AS rel
-                    MATCH (source:KnowledgeNode {id: rel.source_id})
-                    MATCH (target:KnowledgeNode {id: rel.target_id})
-                    CALL apoc.create.relationship(source, rel.relationship_type, {
-                        description: rel.description
-                    }, target) YIELD rel as relationship
-                    RETURN count(relationship)
-                    """
-                    
-                    # 如果没有APOC插件，使用基础语法
-                    fallback_query = """
-                    UNWIND $relationships_data AS rel
-                    MATCH (source:KnowledgeNode {id: rel.source_id})
-                    MATCH (target:KnowledgeNode {id: rel.target_id})
-                    CREATE (source)-[r:RELATED {
-                        type: rel.relationship_type,
-                        description: rel.description
-                    }]->(target)
-                    """
+                        } for row in relationships[i:i + batch_size]]
                     
-                    try:
-                        session.run(query, relationships_data=relationships_data)
-                    except:
-                        # 如果APOC不可用，使用fallback方案
-                        session.run(fallback_query, relationships_data=relationships_data)
+                    if use_apoc:
+                        try:
+                            self._write_batch(session, "relationships", query,
+                                              relationships_data=relationships_data)
+                        except ClientError as e:
+                            # 只有APOC过程不存在时才改用fallback方案，其他客户端错误照常抛出
+                            if e.code != PROCEDURE_NOT_FOUND:
+                                raise
+                            logger.warning("未安装APOC插件，使用RELATED关系导入并在之后改写为层次关系")
+                            use_apoc = False
+                    if not use_apoc:
+                        self._write_batch(session, "relationships", fallback_query,
+                                          relationships_data=relationships_data)
                     
-                    logger.info(f"已导入关系批次 {batch_num}/{total_batches} ({len(batch)}个关系)")
+                    self._commit_batch("relationships", i + len(relationships_data))
+                    self._log_batch("relationships", "关系", batch_num, total_batches, len(relationships_data),
+                                    time.perf_counter() - batch_start,
+                                    len(relationships) - i - len(relationships_data))
             
-            logger.info(f"所有关系导入完成！总计{len(relationships_df)}个关系")
+            self._complete_phase("relationships")
+            logger.info(f"所有关系导入完成！总计{len(relationships)}个关系")
             
         except Exception as e:
             logger.error(f"导入关系时发生错误: {e}")
@@ -183,13 +465,15 @@ class Neo4jImporter:
             """
             MATCH (source:KnowledgeNode)-[r:RELATED]->(target:KnowledgeNode)
             WHERE r.type = 'CONTAINS'
-            CREATE (source)-[:CONTAINS {description: r.description}]->(target)
+            MERGE (source)-[c:CONTAINS]->(target)
+            SET c.description = r.description
             """,
             # 创建INCLUDES关系
             """
             MATCH (source:KnowledgeNode)-[r:RELATED]->(target:KnowledgeNode)
             WHERE r.type = 'INCLUDES'
-            CREATE (source)-[:INCLUDES {description: r.description}]->(target)
+            MERGE (source)-[i:INCLUDES]->(target)
+            SET i.description = r.description
             """,
             # 删除通用RELATED关系
             """
@@ -198,10 +482,15 @@ class Neo4jImporter:
             """
         ]
         
+        if self.checkpoint and self.checkpoint.is_done("hierarchy"):
+            logger.info("层次关系已在之前的运行中创建，跳过")
+            return
+        
         with self.driver.session() as session:
             for query in queries:
-                session.run(query)
+                self._write_batch(session, "hierarchy", query)
             logger.info("已创建层次关系并清理通用关系")
+        self._complete_phase("hierarchy")
     
     def verify_import(self):
         """验证导入结果"""
@@ -227,8 +516,50 @@ class Neo4jImporter:
             for record in type_stats:
                 logger.info(f"  {record['type']}: {record['count']}个节点")
 
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="导入德国家族企业知识图谱到Neo4j")
+    parser.add_argument("--resume", action="store_true",
+                        help="从上次中断的批次继续导入（不清空数据库）")
+    parser.add_argument("--state-file", default=".import_checkpoint.json",
+                        help="断点状态文件路径")
+    parser.add_argument("--report", default="import_report.json",
+                        help="导入性能报告（JSON）输出路径")
+    parser.add_argument("--profile", choices=["cprofile", "pyinstrument"],
+                        help="启用CPU性能剖析并将结果输出到文件")
+    return parser.parse_args()
+
+@contextlib.contextmanager
+def cpu_profiler(kind: Optional[str]):
+    """按需启用cProfile或pyinstrument"""
+    if kind == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats("import_profile.prof")
+            logger.info("cProfile结果已写入: import_profile.prof (可用 snakeviz 或 pstats 查看)")
+    elif kind == "pyinstrument":
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open("import_profile.html", 'w', encoding='utf-8') as f:
+                f.write(profiler.output_html())
+            logger.info("pyinstrument结果已写入: import_profile.html")
+    else:
+        yield
+
 def main():
     """主函数"""
+    args = parse_args()
+    
     # Neo4j连接配置
     NEO4J_URI = "bolt://localhost:7687"  # 根据实际情况修改
     NEO4J_USERNAME = "neo4j"
@@ -238,34 +569,59 @@ def main():
     NODES_FILE = "knowledge_graph_nodes.csv"
     RELATIONSHIPS_FILE = "knowledge_graph_relationships.csv"
     
+    # 二进制快照目录（源CSV未变化时导入直接从快照加载，也供离线分析和本地测试使用）
+    SNAPSHOT_DIR = "graph_snapshot"
+    
     importer = None
     try:
         # 创建导入器实例
-        importer = Neo4jImporter(NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD)
-        
-        # 询问是否清空数据库
-        clear_db = input("是否清空现有数据库? (y/N): ").lower().strip()
-        if clear_db == 'y':
-            importer.clear_database()
-        
-        # 创建约束和索引
-        importer.create_constraints()
+        checkpoint = ImportCheckpoint(args.state_file)
+        importer = Neo4jImporter(NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD, checkpoint)
         
-        # 导入节点
-        logger.info("开始导入节点...")
-        importer.import_nodes(NODES_FILE)
+        if args.resume:
+            logger.info(f"断点续传模式，状态文件: {args.state_file}")
+        else:
+            checkpoint.reset()
+            # 询问是否清空数据库
+            clear_db = input("是否清空现有数据库? (y/N): ").lower().strip()
+            if clear_db == 'y':
+                importer.clear_database()
         
-        # 导入关系
-        logger.info("开始导入关系...")
-        importer.import_relationships(RELATIONSHIPS_FILE)
-        
-        # 创建层次关系
-        logger.info("创建层次关系...")
-        importer.create_hierarchy_relationships()
+        profiler = importer.profiler
+        with cpu_profiler(args.profile):
+            # 创建约束和索引
+            with profiler.phase("constraints"):
+                importer.create_constraints()
+            
+            # 读取节点和关系（快照与CSV一致时从快照加载）
+            with profiler.phase("load"):
+                importer.load_records(NODES_FILE, RELATIONSHIPS_FILE, SNAPSHOT_DIR)
+            
+            # 导入节点
+            logger.info("开始导入节点...")
+            with profiler.phase("nodes"):
+                importer.import_nodes(NODES_FILE)
+            
+            # 导入关系
+            logger.info("开始导入关系...")
+            with profiler.phase("relationships"):
+                importer.import_relationships(RELATIONSHIPS_FILE)
+            
+            # 创建层次关系
+            logger.info("创建层次关系...")
+            with profiler.phase("hierarchy"):
+                importer.create_hierarchy_relationships()
+            
+            # 验证导入结果
+            logger.info("验证导入结果...")
+            with profiler.phase("verify"):
+                importer.verify_import()
         
-        # 验证导入结果
-        logger.info("验证导入结果...")
-        importer.verify_import()
+        # 用已读取的记录生成二进制快照（不再重复解析CSV）
+        try:
+            importer.write_snapshot(SNAPSHOT_DIR)
+        except Exception as e:
+            logger.warning(f"生成图快照失败（不影响导入结果）: {e}")
         
         logger.info("🎉 德国家族企业知识图谱导入完成！")
         logger.info("💡 您可以在Neo4j Browser中使用以下查询语句探索数据：")
@@ -275,10 +631,14 @@ def main():
         
     except Exception as e:
         logger.error(f"导入过程中发生错误: {e}")
+        logger.error("修复问题后可使用 --resume 从中断处继续导入")
         return 1
     
     finally:
         if importer:
+            # 即使导入失败也输出已完成部分的性能数据
+            importer.profiler.log_summary()
+            importer.profiler.write_report(args.report)
             importer.close()
     
     return 0
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MCP服务器轨迹回放压测工具
+回放服务器记录的工具调用轨迹（或按查询混合模板合成的轨迹），统计各工具的吞吐量、尾延迟与错误率
+
+轨迹格式（JSON Lines，与服务器 --trace-file 记录的格式一致）:
+    {"ts": 1700000000.123, "tool": "get_neighborhood", "arguments": {"id": "root", "depth": 1}, ...}
+
+典型流程:
+    # 1. 启动服务器并记录真实调用
+    python neo4j_mcp_server.py --trace-file traces.jsonl
+    # 或者按模板合成轨迹（节点id取自导入用的CSV）
+    python mcp_load_test.py synthesize -o traces.jsonl --rate 20 --duration 60
+
+    # 2. 按2倍速、8个并发客户端回放
+    python mcp_load_test.py replay traces.jsonl --url http://127.0.0.1:8000/sse -c 8 --speedup 2
+
+    # 不启动HTTP服务，在本进程内通过内存传输调用服务器（Neo4j可用本地容器）
+    python mcp_load_test.py replay traces.jsonl --in-process
+
+按原始间隔回放（--speedup > 0）时，延迟从每次调用的计划发出时刻算起，客户端全部占用时的
+排队时间也计入在内，避免服务变慢时压测端同步减速而低估尾延迟；
+以最大速度回放（--speedup 0）时没有计划时刻，延迟从取得客户端、实际发出请求时算起。
+"""
+
+import re
+import csv
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+from contextlib import AsyncExitStack
+from typing import Any, Callable, Dict, List, Optional
+
+from perf_stats import TOOL_ERROR_PREFIXES, percentile
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_URL = "http://127.0.0.1:8000/sse"
+NODE_ID_PLACEHOLDER = re.compile(r"\{node_id\}")
+
+# 默认查询混合：weight为相对权重，arguments中的 {node_id} 每次出现都替换为一个随机节点id
+DEFAULT_MIX = {
+    "explain_database_structure": {"weight": 1, "arguments": [{}]},
+    "get_node_details": {"weight": 3, "arguments": [{"ids": ["{node_id}"]},
+                                                    {"ids": ["{node_id}", "{node_id}", "{node_id}"]}]},
+    "get_neighborhood": {"weight": 3, "arguments": [{"id": "{node_id}", "depth": 1},
+                                                    {"id": "{node_id}", "depth": 2, "max_per_hop": 5}]},
+    "find_connections": {"weight": 2, "arguments": [{"source": "{node_id}", "target": "{node_id}"}]},
+    "run_cypher_query": {"weight": 1, "arguments": [
+        {"query": "MATCH (n:KnowledgeNode {id: '{node_id}'})-[r]-(m) RETURN m.name, type(r) LIMIT 10"},
+    ]},
+}
+
+
+def load_trace(path: str) -> List[Dict]:
+    """读取轨迹文件，按时间排序"""
+    trace = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"跳过无法解析的轨迹行 {line_no}")
+                continue
+            trace.append({"ts": float(entry.get("ts", 0)), "tool": entry["tool"],
+                          "arguments": entry.get("arguments") or {}})
+    trace.sort(key=lambda e: e["ts"])
+    return trace
+
+
+def _fill_placeholders(value: Any, node_ids: List[str], rng: random.Random) -> Any:
+    """递归替换参数中的 {node_id} 占位符"""
+    if isinstance(value, str):
+        return NODE_ID_PLACEHOLDER.sub(lambda _: rng.choice(node_ids), value)
+    if isinstance(value, list):
+        return [_fill_placeholders(v, node_ids, rng) for v in value]
+    if isinstance(value, dict):
+        return {k: _fill_placeholders(v, node_ids, rng) for k, v in value.items()}
+    return value
+
+
+def synthesize_trace(mix: Dict[str, Dict], node_ids: List[str], rate: float, duration: float,
+                     seed: Optional[int] = None) -> List[Dict]:
+    """
+    按查询混合模板合成轨迹
+
+    Args:
+        mix: 工具名 -> {"weight": 相对权重, "arguments": 参数模板列表}
+        node_ids: 用于填充 {node_id} 的节点id
+        rate: 平均每秒调用数（泊松到达）
+        duration: 轨迹时长（秒）
+        seed: 随机种子，便于复现
+
+    Returns:
+        轨迹条目列表
+    """
+    if not node_ids:
+        raise ValueError("没有可用于填充参数的节点id")
+    rng = random.Random(seed)
+    tools = list(mix)
+    weights = [mix[tool].get("weight", 1) for tool in tools]
+
+    trace, ts = [], 0.0
+    while True:
+        ts += rng.expovariate(rate)
+        if ts >= duration:
+            break
+        tool = rng.choices(tools, weights)[0]
+        template = rng.choice(mix[tool].get("arguments") or [{}])
+        trace.append({"ts": round(ts, 6), "tool": tool,
+                      "arguments": _fill_placeholders(template, node_ids, rng)})
+    return trace
+
+
+def read_node_ids(nodes_file: str) -> List[str]:
+    with open(nodes_file, 'r', encoding='utf-8') as f:
+        return [row["id"] for row in csv.DictReader(f) if row.get("id")]
+
+
+def _result_text(result: Any) -> str:
+    """兼容不同版本fastmcp的call_tool返回值（内容列表或CallToolResult）"""
+    content = getattr(result, "content", result) or []
+    return "".join(getattr(item, "text", "") for item in content)
+
+
+class LoadStats:
+    """按工具统计调用次数、错误数与延迟"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.error_samples: Dict[str, str] = {}
+        self.started_at = time.perf_counter()
+        self.finished_at: Optional[float] = None
+
+    def record(self, tool: str, latency: float, error: Optional[str] = None):
+        self.latencies.setdefault(tool, []).append(latency)
+        if error is not None:
+            self.errors[tool] = self.errors.get(tool, 0) + 1
+            self.error_samples.setdefault(tool, (error.strip().splitlines() or [""])[0][:200])
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def _summary(self, latencies: List[float], errors: int) -> Dict[str, Any]:
+        elapsed = self.elapsed
+        return {
+            "calls": len(latencies),
+            "errors": errors,
+            "error_rate": round(errors / len(latencies), 4) if latencies else 0.0,
+            "throughput_per_second": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            "latency_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "latency_p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "latency_p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "latency_max_ms": round(max(latencies) * 1000, 2) if latencies else 0.0,
+        }
+
+    def report(self) -> Dict[str, Any]:
+        """生成机器可读的报告"""
+        all_latencies = [v for values in self.latencies.values() for v in values]
+        return {
+            "elapsed_seconds": round(self.elapsed, 4),
+            "total": self._summary(all_latencies, sum(self.errors.values())),
+            "tools": {tool: self._summary(values, self.errors.get(tool, 0))
+                      for tool, values in sorted(self.latencies.items())},
+            "error_samples": self.error_samples,
+        }
+
+    def log_summary(self):
+        report = self.report()
+        logger.info(f"回放完成，用时 {report['elapsed_seconds']:.2f}s")
+        rows = list(report["tools"].items()) + [("全部", report["total"])]
+        for tool, data in rows:
+            logger.info(
+                f"  {tool}: {data['calls']}次, {data['throughput_per_second']}/s, "
+                f"错误率 {data['error_rate']:.2%}, "
+                f"p50 {data['latency_p50_ms']}ms, p95 {data['latency_p95_ms']}ms, "
+                f"p99 {data['latency_p99_ms']}ms, max {data['latency_max_ms']}ms"
+            )
+        for tool, sample in report["error_samples"].items():
+            logger.info(f"  {tool} 错误示例: {sample}")
+
+
+async def replay_trace(trace: List[Dict], make_client: Callable[[], Any], concurrency: int = 4,
+                       speedup: float = 1.0) -> LoadStats:
+    """
+    回放轨迹
+
+    Args:
+        trace: 轨迹条目（按ts排序）
+        make_client: 创建fastmcp Client的工厂函数，每个并发槽位一个客户端会话
+        concurrency: 并发客户端数
+        speedup: 加速倍数；0表示忽略原始间隔，以最大速度发送
+
+    Returns:
+        统计结果
+    """
+    stats = LoadStats()
+    if not trace:
+        return stats
+
+    async with AsyncExitStack() as stack:
+        pool: asyncio.Queue = asyncio.Queue()
+        for _ in range(max(concurrency, 1)):
+            pool.put_nowait(await stack.enter_async_context(make_client()))
+
+        loop = asyncio.get_running_loop()
+        base_ts = trace[0]["ts"]
+        stats.started_at = time.perf_counter()
+        start = loop.time()
+
+        async def fire(entry: Dict):
+            scheduled = None
+            if speedup > 0:
+                scheduled = start + (entry["ts"] - base_ts) / speedup
+                await asyncio.sleep(max(scheduled - loop.time(), 0))
+            client = await pool.get()
+            sent = loop.time()
+            error = None
+            try:
+                result = await client.call_tool(entry["tool"], entry["arguments"])
+                text = _result_text(result)
+                if getattr(result, "is_error", False) or text.startswith(TOOL_ERROR_PREFIXES):
+                    error = text
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            finally:
+                pool.put_nowait(client)
+            stats.record(entry["tool"], loop.time() - (sent if scheduled is None else scheduled), error)
+
+        await asyncio.gather(*(fire(entry) for entry in trace))
+        stats.finished_at = time.perf_counter()
+    return stats
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="MCP服务器轨迹回放压测工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    synth_parser = subparsers.add_parser("synthesize", help="按查询混合模板合成轨迹")
+    synth_parser.add_argument("-o", "--output", required=True, help="输出轨迹文件（JSON Lines）")
+    synth_parser.add_argument("--mix", help="查询混合模板JSON文件，默认使用内置模板")
+    synth_parser.add_argument("--nodes", default="knowledge_graph_nodes.csv", help="提供节点id的CSV文件")
+    synth_parser.add_argument("--rate", type=float, default=10.0, help="平均每秒调用数")
+    synth_parser.add_argument("--duration", type=float, default=60.0, help="轨迹时长（秒）")
+    synth_parser.add_argument("--seed", type=int, help="随机种子")
+
+    replay_parser = subparsers.add_parser("replay", help="回放轨迹并统计延迟")
+    replay_parser.add_argument("trace", help="轨迹文件（JSON Lines）")
+    replay_parser.add_argument("--url", default=DEFAULT_URL,
+                               help="服务器地址，以/sse结尾使用SSE，以/mcp结尾使用streamable-http")
+    replay_parser.add_argument("--in-process", action="store_true",
+                               help="在本进程内加载服务器，通过内存传输调用（不经过HTTP）")
+    replay_parser.add_argument("-c", "--concurrency", type=int, default=4, help="并发客户端数")
+    replay_parser.add_argument("--speedup", type=float, default=1.0, help="加速倍数，0表示不等待原始间隔")
+    replay_parser.add_argument("--limit", type=int, help="只回放前N条")
+    replay_parser.add_argument("--report", help="将统计报告以JSON写入该文件")
+
+    args = parser.parse_args()
+
+    if args.command == "synthesize":
+        mix = DEFAULT_MIX
+        if args.mix:
+            with open(args.mix, 'r', encoding='utf-8') as f:
+                mix = json.load(f)
+        trace = synthesize_trace(mix, read_node_ids(args.nodes), args.rate, args.duration, args.seed)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for entry in trace:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        logger.info(f"已合成 {len(trace)} 条调用: {args.output}")
+        return 0
+
+    from fastmcp import Client
+
+    trace = load_trace(args.trace)[:args.limit]
+    if args.in_process:
+        import neo4j_mcp_server
+
+        neo4j_mcp_server.init_server()
+        make_client = lambda: Client(neo4j_mcp_server.mcp)
+        target = "进程内服务器"
+    else:
+        make_client = lambda: Client(args.url)
+        target = args.url
+
+    logger.info(f"开始回放 {len(trace)} 条调用 -> {target} "
+                f"(并发 {args.concurrency}, 加速 {args.speedup}x)")
+    stats = asyncio.run(replay_trace(trace, make_client, args.concurrency, args.speedup))
+    stats.log_summary()
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(stats.report(), f, ensure_ascii=False, indent=2)
+        logger.info(f"压测报告已写入: {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -5,16 +5,41 @@ Neo4j MCP Server - 专门用于与Neo4j图数据库交互的MCP服务器
 提供核心的Cypher查询和数据库结构解释功能
 """
 
+import os
+import re
 import json
+import time
+import heapq
+import asyncio
+import sqlite3
+import argparse
+import tempfile
+import random
 import logging
-from typing import Dict, List, Optional
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from neo4j import GraphDatabase
-from neo4j.exceptions import ServiceUnavailable, AuthError
+from neo4j.exceptions import ServiceUnavailable, SessionExpired, AuthError
 
 # 使用新版本的FastMCP
 from fastmcp import FastMCP
 
+from graph_export import EXPORT_FORMATS, SubgraphSelection, export_subgraph as stream_subgraph_to_file
+from perf_stats import TOOL_ERROR_PREFIXES
+
+try:
+    from fastmcp.server.dependencies import get_context
+except ImportError:  # 旧版本FastMCP不提供请求上下文
+    get_context = None
+
+try:
+    from fastmcp.server.dependencies import get_access_token, get_http_request
+except ImportError:
+    get_access_token = get_http_request = None
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -27,48 +52,977 @@ NEO4J_URI = "bolt://localhost:7687"
 NEO4J_USERNAME = "neo4j"
 NEO4J_PASSWORD = "chenxingyu"
 
+# 服务器部署配置（可通过环境变量或命令行参数覆盖）
+MCP_HOST = os.getenv("MCP_HOST", "127.0.0.1")
+MCP_PORT = int(os.getenv("MCP_PORT", "8000"))
+MCP_TRANSPORT = os.getenv("MCP_TRANSPORT", "sse")          # sse 或 streamable-http
+MCP_WORKERS = int(os.getenv("MCP_WORKERS", "1"))
+# 由可信反向代理设置的客户端标识请求头（如 X-Forwarded-For），用于按客户端限流；为空时不读取
+MCP_CLIENT_ID_HEADER = os.getenv("MCP_CLIENT_ID_HEADER", "")
+# 多进程共享的SQLite缓存文件；为空时仅使用进程内缓存
+MCP_SHARED_CACHE = os.getenv("MCP_SHARED_CACHE", "")
+DEFAULT_SHARED_CACHE = os.path.join(tempfile.gettempdir(), "neo4j_mcp_cache.sqlite3")
+# 多worker时只由一个进程生成共享结果（schema说明、预热查询），其他进程最多等待这么久（秒）
+SHARED_BUILD_TIMEOUT = float(os.getenv("SHARED_BUILD_TIMEOUT", "120"))
+SHARED_BUILD_POLL_INTERVAL = 0.2
+
+# 工具调用轨迹记录文件（JSON Lines），供 mcp_load_test.py 回放；为空时不记录
+MCP_TRACE_FILE = os.getenv("MCP_TRACE_FILE", "")
+
+# 重连配置（指数退避）
+RECONNECT_MAX_ATTEMPTS = 5
+RECONNECT_BASE_DELAY = 0.5
+RECONNECT_MAX_DELAY = 8.0
+# 健康检查只探测一次，不经过重连退避
+HEALTH_CHECK_TIMEOUT = 3.0
+
+# 查询结果缓存配置
+QUERY_CACHE_SIZE = 256
+QUERY_CACHE_TTL = 300
+
+# schema统计模式：sampled 使用schema过程+计数存储+服务端抽样，exact 全量扫描
+SCHEMA_STATS_MODE = os.getenv("SCHEMA_STATS_MODE", "sampled")
+SCHEMA_SAMPLE_SIZE = int(os.getenv("SCHEMA_SAMPLE_SIZE", "1000"))
+# 抽样和名称样例查询每个标签最多读取的节点数，保证耗时不随图规模增长
+# （节点数超过该值时只在存储顺序靠前的节点中抽样，结果会标注可能有偏差）
+SCHEMA_SCAN_LIMIT = int(os.getenv("SCHEMA_SCAN_LIMIT", "20000"))
+
+# 节点按id查找时使用的标签（导入脚本为KnowledgeNode.id创建了唯一约束）
+NODE_LABEL = os.getenv("NODE_LABEL", "KnowledgeNode")
+
+# 邻域扩展配置
+ADJACENCY_CACHE_SIZE = 2048        # 缓存邻接表的节点数
+ADJACENCY_FETCH_LIMIT = 200        # 每个节点最多缓存的邻接边数
+MAX_NEIGHBORHOOD_DEPTH = 3
+MAX_NEIGHBORS_PER_HOP = 50
+MAX_NEIGHBORHOOD_NODES = 500
+
+# 子图导出目录：工具只允许写入该目录
+MCP_EXPORT_DIR = os.getenv("MCP_EXPORT_DIR", "exports")
+
+# 连接查找（双向BFS）配置
+MAX_CONNECTION_HOPS = 6
+MAX_CONNECTION_PATHS = 10
+MAX_CONNECTION_EXPANSIONS = 2000   # 最多展开的节点数，保证延迟可预测
+
+# schema说明的缓存时间（秒），过期后重新生成，重新导入数据后无需重启服务器
+SCHEMA_DESCRIPTION_TTL = int(os.getenv("SCHEMA_DESCRIPTION_TTL", "600"))
+
+# 启动预热：在后台预先生成schema说明并缓存常用查询
+WARMUP_ON_START = True
+HOT_QUERIES = [
+    "MATCH (n:Node) RETURN n.type, count(n) as count ORDER BY count DESC",
+    "MATCH (n) RETURN count(n) as count",
+    "MATCH ()-[r]->() RETURN type(r) as type, count(r) as count ORDER BY count DESC",
+]
+
+
+# 字面量参数化配置
+PARAMETERIZE_LITERALS = True
+# 用于估算服务端执行计划缓存命中率（与Neo4j默认的 dbms.query_cache_size 一致）
+PLAN_CACHE_SIZE = 1000
+
+_CYPHER_TOKEN_PATTERN = re.compile(r"""
+    (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<backtick>`(?:[^`]|``)*`)
+  | (?P<param>\$(?:\w+|`[^`]*`))
+  | (?P<number>(?<![\w.])(?:\d+\.\d+(?:[eE][+-]?\d+)?|\d+[eE][+-]?\d+|\d+)(?![\w.]))
+  | (?P<word>[A-Za-z_]\w*)
+  | (?P<op><>|<=|>=|=~|\.\.|\S)
+  | (?P<space>\s+)
+""", re.VERBOSE | re.DOTALL)
+
+_CLAUSE_KEYWORDS = {"MATCH", "WHERE", "RETURN", "ORDER", "SKIP", "LIMIT", "UNWIND", "CALL", "YIELD", "UNION"}
+_COMPARISON_OPERATORS = {"=", "<>", "<", ">", "<=", ">=", "=~"}
+_STRING_ESCAPES = {"\\": "\\", "'": "'", '"': '"', "n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}
+
+
+def _decode_cypher_string(literal: str) -> str:
+    """解码Cypher字符串字面量（去除引号并处理转义）"""
+    body = literal[1:-1]
+    out = []
+    i = 0
+    while i < len(body):
+        ch = body[i]
+        if ch == "\\" and i + 1 < len(body):
+            nxt = body[i + 1]
+            if nxt == "u" and i + 6 <= len(body):
+                out.append(chr(int(body[i + 2:i + 6], 16)))
+                i += 6
+                continue
+            out.append(_STRING_ESCAPES.get(nxt, "\\" + nxt))
+            i += 2
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def parameterize_literals(query: str, parameters: Optional[Dict] = None) -> Tuple[str, Dict, int]:
+    """将查询中的字符串/数字字面量提取为参数
+    
+    只改写比较运算、CONTAINS/STARTS WITH/ENDS WITH/IN、属性映射以及LIMIT/SKIP中的字面量；
+    RETURN子句中的字面量保持不变，避免改变结果列名。相同的字面量复用同一参数。
+    
+    Returns:
+        (改写后的查询, 合并后的参数, 提取的字面量数量)
+    """
+    parameters = dict(parameters or {})
+    tokens = [(m.lastgroup, m.group()) for m in _CYPHER_TOKEN_PATTERN.finditer(query)]
+    if "".join(text for _, text in tokens) != query:
+        return query, parameters, 0
+    
+    generated: Dict[Tuple[str, str, Any], str] = {}
+    significant: List[Tuple[str, str]] = []
+    brace_depth = 0
+    in_list_depth: List[int] = []
+    bracket_depth = 0
+    clause = ""
+    lifted = 0
+    output = []
+    
+    for kind, text in tokens:
+        if kind in ("space", "comment"):
+            output.append(text)
+            continue
+        
+        if kind == "word" and text.upper() in _CLAUSE_KEYWORDS:
+            clause = text.upper()
+        
+        if kind in ("string", "number") and (clause != "RETURN" or brace_depth > 0):
+            prev = significant[-1] if significant else ("", "")
+            prev_upper = prev[1].upper()
+            prev2_upper = significant[-2][1].upper() if len(significant) > 1 else ""
+            lift = (
+                prev[1] in _COMPARISON_OPERATORS
+                or prev_upper == "CONTAINS"
+                or (prev_upper == "WITH" and prev2_upper in ("STARTS", "ENDS"))
+                or prev_upper == "IN"
+                or (prev[1] == ":" and brace_depth > 0)
+                or (in_list_depth and in_list_depth[-1] == bracket_depth and prev[1] in ("[", ","))
+                or (kind == "number" and prev_upper in ("LIMIT", "SKIP") and text.isdigit())
+            )
+            if lift:
+                if kind == "string":
+                    value: Any = _decode_cypher_string(text)
+                elif text.isdigit():
+                    value = int(text)
+                else:
+                    value = float(text)
+                # 带上类型，避免 1 与 1.0（相等且哈希相同）共用同一个参数
+                key = (kind, type(value).__name__, value)
+                name = generated.get(key)
+                if name is None:
+                    name = f"lit_{len(generated)}"
+                    while name in parameters:
+                        name = "_" + name
+                    generated[key] = name
+                    parameters[name] = value
+                output.append("$" + name)
+                lifted += 1
+                significant.append(("param", "$" + name))
+                continue
+        
+        if text == "{":
+            brace_depth += 1
+        elif text == "}":
+            brace_depth = max(brace_depth - 1, 0)
+        elif text == "[":
+            bracket_depth += 1
+            if significant and significant[-1][1].upper() == "IN":
+                in_list_depth.append(bracket_depth)
+        elif text == "]":
+            if in_list_depth and in_list_depth[-1] == bracket_depth:
+                in_list_depth.pop()
+            bracket_depth = max(bracket_depth - 1, 0)
+        
+        output.append(text)
+        significant.append((kind, text))
+    
+    return "".join(output), parameters, lifted
+
+
+# 准入控制配置
+MAX_CONCURRENT_TOOL_CALLS = 8     # 全局并发执行上限
+MAX_QUEUED_TOOL_CALLS = 32        # 等待队列上限，超出后立即拒绝
+QUEUE_TIMEOUT = 10.0              # 排队等待的最长秒数
+CLIENT_RATE_PER_SECOND = 5.0      # 每个客户端的令牌补充速率
+CLIENT_BURST = 20                 # 每个客户端的令牌桶容量
+
+# 优先级：数值越小越优先
+PRIORITY_HIGH = 0    # schema说明、按id查找等廉价调用
+PRIORITY_LOW = 10    # 分析型Cypher查询
+
+
+class AdmissionRejected(Exception):
+    """工具调用被准入控制拒绝"""
+
+
+class TokenBucket:
+    """令牌桶限流器"""
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+    
+    def try_consume(self, amount: float = 1.0) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+
+class AdmissionController:
+    """工具调用准入控制：全局并发上限、按客户端限流、有界优先级等待队列
+    
+    运行在事件循环线程上：等待者是挂在优先级堆里的future，排队不会阻塞事件循环。
+    """
+    
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_TOOL_CALLS,
+                 max_queued: int = MAX_QUEUED_TOOL_CALLS, queue_timeout: float = QUEUE_TIMEOUT,
+                 rate: float = CLIENT_RATE_PER_SECOND, burst: float = CLIENT_BURST):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._waiting: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = 0
+        self.active = 0
+        self.admitted = 0
+        self.rejected_rate_limited = 0
+        self.rejected_queue_full = 0
+        self.timed_out = 0
+        self.max_queue_depth = 0
+    
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiting)
+    
+    def _bucket(self, client_id: str) -> TokenBucket:
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            # 清理长时间空闲（令牌已补满）的客户端
+            if len(self._buckets) > 1024:
+                now = time.monotonic()
+                idle = [k for k, b in self._buckets.items() if now - b.updated > self.burst / self.rate]
+                for k in idle:
+                    del self._buckets[k]
+            bucket = self._buckets[client_id] = TokenBucket(self.rate, self.burst)
+        return bucket
+    
+    def _dequeue(self, entry: Tuple[int, int, asyncio.Future]):
+        self._waiting.remove(entry)
+        heapq.heapify(self._waiting)
+    
+    async def acquire(self, client_id: str, priority: int = PRIORITY_LOW):
+        """获取执行槽位，失败时抛出AdmissionRejected"""
+        if not self._bucket(client_id).try_consume():
+            self.rejected_rate_limited += 1
+            raise AdmissionRejected(f"客户端 {client_id} 请求过于频繁，请稍后重试")
+        
+        if self.active < self.max_concurrent and not self._waiting:
+            self.active += 1
+            self.admitted += 1
+            return
+        
+        if len(self._waiting) >= self.max_queued:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected("服务器繁忙，等待队列已满，请稍后重试")
+        
+        future = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        entry = (priority, self._seq, future)
+        heapq.heappush(self._waiting, entry)
+        self.max_queue_depth = max(self.max_queue_depth, len(self._waiting))
+        
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():  # 超时与被唤醒同时发生，槽位已转交给本调用
+                return
+            self._dequeue(entry)
+            self.timed_out += 1
+            raise AdmissionRejected(f"排队超过 {self.queue_timeout:.0f} 秒，请稍后重试")
+        except asyncio.CancelledError:
+            # 客户端断开：已转交的槽位归还，仍在排队则移出队列
+            if future.done() and not future.cancelled():
+                self.release()
+            elif entry in self._waiting:
+                self._dequeue(entry)
+            raise
+    
+    def release(self):
+        """释放执行槽位，直接转交给优先级最高的等待者"""
+        while self._waiting:
+            _, _, future = heapq.heappop(self._waiting)
+            if not future.done():
+                self.admitted += 1
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+# 无状态streamable HTTP（多worker模式）下每个请求都是新会话，会话id不能作为客户端标识
+stateless_sessions = False
+
+
+def _current_client_id() -> str:
+    """获取当前调用方的客户端标识
+    
+    依次使用：认证主体、MCP_CLIENT_ID_HEADER 请求头、有状态会话的会话id、远端地址。
+    """
+    if get_access_token is not None:
+        try:
+            token = get_access_token()
+            if token is not None and token.client_id:
+                return f"auth:{token.client_id}"
+        except Exception:
+            pass
+    
+    request = None
+    if get_http_request is not None:
+        try:
+            request = get_http_request()
+        except Exception:
+            pass
+    if request is not None and MCP_CLIENT_ID_HEADER:
+        value = request.headers.get(MCP_CLIENT_ID_HEADER, "").split(",")[0].strip()
+        if value:
+            return f"header:{value}"
+    
+    if get_context is not None and not stateless_sessions:
+        try:
+            session_id = getattr(get_context(), "session_id", None)
+            if session_id:
+                return f"session:{session_id}"
+        except Exception:
+            pass
+    
+    if request is not None and request.client is not None:
+        return f"addr:{request.client.host}"
+    return "anonymous"
+
+
+class TraceRecorder:
+    """将工具调用（工具名、参数、开始时间、耗时、是否成功）追加写入JSON Lines文件"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+    
+    def record(self, tool: str, arguments: Dict, started_at: float, duration: float, result: Any):
+        ok = not (isinstance(result, str) and result.startswith(TOOL_ERROR_PREFIXES))
+        line = json.dumps({
+            "ts": round(started_at, 6), "tool": tool, "arguments": arguments,
+            "duration_ms": round(duration * 1000, 3), "ok": ok,
+        }, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+
+trace_recorder: Optional[TraceRecorder] = None
+
+
+def admission_controlled(priority: int = PRIORITY_LOW):
+    """为工具函数加上准入控制（启用轨迹记录时同时记录调用）
+    
+    工具函数本身是同步的阻塞代码：包装后的工具是异步的，准入在事件循环上完成，
+    函数体放到线程池中执行，不会阻塞其他会话。
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started_at, start = time.time(), time.perf_counter()
+            result = None
+            try:
+                await admission.acquire(_current_client_id(), priority)
+            except AdmissionRejected as e:
+                result = f"⏳ 请求被拒绝: {e}"
+            else:
+                try:
+                    result = await asyncio.to_thread(func, *args, **kwargs)
+                finally:
+                    admission.release()
+            finally:
+                if trace_recorder is not None:
+                    trace_recorder.record(func.__name__, kwargs, started_at,
+                                          time.perf_counter() - start, result)
+            return result
+        return wrapper
+    return decorator
+
+
+# 结果投影配置：RETURN节点变量时只返回轻量字段和描述预览
+PROJECT_NODE_RESULTS = True
+NODE_PROJECTION_FIELDS = ("id", "name", "type")
+DESCRIPTION_PREVIEW_LENGTH = 80
+MAX_DETAIL_IDS = 50
+
+_PATTERN_PRECEDERS = {"MATCH", ",", "-", ">", "<", "="}
+_RETURN_TERMINATORS = {"ORDER", "SKIP", "LIMIT", "UNION", ";"}
+
+
+def _unsafe_alias_references(tokens: List[Tuple[str, str]], significant: List[int], start: int,
+                             aliases: set) -> set:
+    """找出RETURN之后（ORDER BY/SKIP/LIMIT，直到UNION）以投影字段之外的方式引用的别名"""
+    allowed = set(NODE_PROJECTION_FIELDS) | {"description_preview"}
+    unsafe = set()
+    depth = 0
+    for pos in range(start, len(significant)):
+        kind, text = tokens[significant[pos]]
+        if text in ("(", "[", "{"):
+            depth += 1
+        elif text in (")", "]", "}"):
+            depth -= 1
+        elif depth == 0 and (text == ";" or text.upper() == "UNION"):
+            break
+        if kind != "word" or text not in aliases:
+            continue
+        prev_text = tokens[significant[pos - 1]][1] if pos > 0 else ""
+        next_texts = [tokens[significant[i]][1] for i in range(pos + 1, min(pos + 3, len(significant)))]
+        if prev_text != "." and not (len(next_texts) == 2 and next_texts[0] == "." and next_texts[1] in allowed):
+            unsafe.add(text)
+    return unsafe
+
+
+def project_node_returns(query: str) -> Tuple[str, int]:
+    """将RETURN中直接返回的节点变量改写为轻量投影
+    
+    例如 MATCH (n:Node) RETURN n 改写为
+    RETURN n {.id, .name, .type, description_preview: left(n.description, 80)} AS n，
+    避免长description在网络上传输并被转换为字典。
+    
+    Returns:
+        (改写后的查询, 被投影的返回项数量)
+    """
+    tokens = [(m.lastgroup, m.group()) for m in _CYPHER_TOKEN_PATTERN.finditer(query)]
+    if "".join(text for _, text in tokens) != query:
+        return query, 0
+    significant = [i for i, (kind, _) in enumerate(tokens) if kind not in ("space", "comment")]
+    
+    # 找出模式中绑定的节点变量：紧跟在模式起始的 "(" 之后
+    node_vars = set()
+    for pos, idx in enumerate(significant[1:-1], 1):
+        kind, text = tokens[idx]
+        prev_text = tokens[significant[pos - 1]][1]
+        prev2_text = tokens[significant[pos - 2]][1].upper() if pos >= 2 else ""
+        next_text = tokens[significant[pos + 1]][1]
+        if (kind == "word" and prev_text == "("
+                and (prev2_text in _PATTERN_PRECEDERS or pos < 2)
+                and next_text in (":", ")", "{")):
+            node_vars.add(text)
+    if not node_vars:
+        return query, 0
+    
+    # UNION各分支的返回列必须一致：某个分支中不能投影的别名在所有分支中都不投影
+    all_candidates: List[Tuple[List[int], str, str]] = []
+    unsafe: set = set()
+    depth = 0
+    pos = 0
+    while pos < len(significant):
+        kind, text = tokens[significant[pos]]
+        if text in "([{":
+            depth += 1
+        elif text in ")]}":
+            depth -= 1
+        elif depth == 0 and kind == "word" and text.upper() == "RETURN":
+            # 收集RETURN子句的各返回项
+            pos += 1
+            if pos < len(significant) and tokens[significant[pos]][1].upper() == "DISTINCT":
+                pos += 1
+            item: List[int] = []
+            item_depth = 0
+            candidates: List[Tuple[List[int], str, str]] = []
+            while pos <= len(significant):
+                at_end = pos == len(significant)
+                current = tokens[significant[pos]] if not at_end else ("", "")
+                if not at_end and current[1] in "([{":
+                    item_depth += 1
+                elif not at_end and current[1] in ")]}":
+                    item_depth -= 1
+                if at_end or (item_depth == 0 and (current[1] == "," or current[1].upper() in _RETURN_TERMINATORS)):
+                    words = [tokens[i][1] for i in item]
+                    if (len(words) == 1 or (len(words) == 3 and words[1].upper() == "AS")) and words[0] in node_vars:
+                        candidates.append((item, words[0], words[2] if len(words) == 3 else words[0]))
+                    item = []
+                    if at_end or current[1] != ",":
+                        break
+                else:
+                    item.append(significant[pos])
+                pos += 1
+            
+            # ORDER BY中的别名指向投影后的map：除投影字段外的用法（如 id(n)、n.description）会出错，这类返回项不投影
+            unsafe |= _unsafe_alias_references(tokens, significant, pos, {alias for _, _, alias in candidates})
+            all_candidates.extend(candidates)
+            continue
+        pos += 1
+    
+    replacements: Dict[int, str] = {}
+    for item, var, alias in all_candidates:
+        if alias in unsafe:
+            continue
+        fields = ", ".join(f".{f}" for f in NODE_PROJECTION_FIELDS)
+        replacements[item[0]] = (
+            f"{var} {{{fields}, description_preview: "
+            f"left({var}.description, {DESCRIPTION_PREVIEW_LENGTH})}} AS {alias}"
+        )
+        for i in range(item[0] + 1, item[-1] + 1):
+            replacements[i] = ""
+    
+    if not replacements:
+        return query, 0
+    output = []
+    for i, (_, text) in enumerate(tokens):
+        output.append(replacements.get(i, text))
+    projected = sum(1 for text in replacements.values() if text)
+    return "".join(output), projected
+
+
+class PlanCacheTracker:
+    """估算Neo4j执行计划缓存命中率
+    
+    Neo4j按查询文本缓存执行计划，这里用同等容量的LRU记录查询文本，
+    分别统计参数化前后的命中率以观察改写效果。
+    只记录真正发送到数据库的查询（结果缓存命中、合并到进行中请求的调用不计入）；
+    服务端缓存还受其他客户端和计划失效影响，因此结果只是客户端估算值。
+    """
+    
+    def __init__(self, size: int = PLAN_CACHE_SIZE):
+        self.size = size
+        self._raw: "OrderedDict[str, None]" = OrderedDict()
+        self._rewritten: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total = 0
+        self.raw_hits = 0
+        self.hits = 0
+        self.literals_lifted = 0
+    
+    def _touch(self, lru: "OrderedDict[str, None]", query: str) -> bool:
+        hit = query in lru
+        lru[query] = None
+        lru.move_to_end(query)
+        while len(lru) > self.size:
+            lru.popitem(last=False)
+        return hit
+    
+    def record(self, raw_query: str, rewritten_query: str, lifted: int):
+        with self._lock:
+            self.total += 1
+            self.literals_lifted += lifted
+            self.raw_hits += self._touch(self._raw, raw_query)
+            self.hits += self._touch(self._rewritten, rewritten_query)
+    
+    def hit_rate(self, raw: bool = False) -> float:
+        if not self.total:
+            return 0.0
+        return (self.raw_hits if raw else self.hits) / self.total
+
+
+class QueryCache:
+    """带TTL的LRU查询结果缓存（线程安全）"""
+    
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """折叠字符串字面量和反引号标识符之外的空白"""
+        tokens = [(m.lastgroup, m.group()) for m in _CYPHER_TOKEN_PATTERN.finditer(query)]
+        if "".join(text for _, text in tokens) != query:
+            return query
+        return "".join(" " if kind == "space" else text for kind, text in tokens).strip()
+    
+    @staticmethod
+    def make_key(query: str, parameters: Optional[Dict] = None) -> str:
+        """根据查询语句和参数生成缓存键"""
+        normalized = QueryCache.normalize_query(query)
+        return normalized + "\x00" + json.dumps(parameters or {}, sort_keys=True, ensure_ascii=False, default=str)
+    
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SingleFlight:
+    """合并相同键的并发调用：同一时刻只执行一次，其余调用者共享结果"""
+    
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result: Any = None
+            self.error: Optional[BaseException] = None
+    
+    def __init__(self):
+        self._calls: Dict[str, "SingleFlight._Call"] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+    
+    def do(self, key: str, fn):
+        """执行fn()；若相同key的调用正在进行，则等待并复用其结果"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = SingleFlight._Call()
+                self.executions += 1
+                leader = True
+        
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+    
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+class SharedCache:
+    """基于本地SQLite文件的跨进程缓存，供多个worker共享schema说明和查询结果
+    
+    leases表记录跨进程租约：同一个键同一时刻只有一个进程负责生成，其他进程等待结果写入。
+    """
+    
+    PURGE_INTERVAL = 100
+    
+    def __init__(self, path: str, ttl: float = QUERY_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.owner = f"{os.getpid()}:{id(self)}"
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+        self.waits = 0
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                "key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+    
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            row = self._connection().execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Shared cache read failed: {e}")
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+    
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        payload = json.dumps(value, ensure_ascii=False, default=str)
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, payload, time.time() + (ttl or self.ttl))
+                )
+                self._writes += 1
+                if self._writes % self.PURGE_INTERVAL == 0:
+                    conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        except sqlite3.Error as e:
+            logger.warning(f"Shared cache write failed: {e}")
+    
+    def try_lease(self, key: str, ttl: float) -> bool:
+        """尝试获取键的租约；其他进程持有未过期的租约时返回False
+        
+        BEGIN IMMEDIATE 立即取得写锁，检查与写入在同一事务中完成，多个进程不会同时拿到租约。
+        SQLite出错时返回True，由当前进程自行生成（退化为各进程独立生成）。
+        """
+        now = time.time()
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT owner, expires_at FROM leases WHERE key = ?", (key,)).fetchone()
+                if row and row[0] != self.owner and row[1] > now:
+                    conn.rollback()
+                    return False
+                conn.execute(
+                    "INSERT OR REPLACE INTO leases (key, owner, expires_at) VALUES (?, ?, ?)",
+                    (key, self.owner, now + ttl)
+                )
+                conn.commit()
+                return True
+            except BaseException:
+                conn.rollback()
+                raise
+        except sqlite3.Error as e:
+            logger.warning(f"Shared cache lease failed: {e}")
+            return True
+    
+    def release_lease(self, key: str):
+        try:
+            with self._connection() as conn:
+                conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.owner))
+        except sqlite3.Error as e:
+            logger.warning(f"Shared cache lease release failed: {e}")
+    
+    def get_or_build(self, key: str, builder, ttl: Optional[float] = None,
+                     timeout: float = SHARED_BUILD_TIMEOUT) -> Any:
+        """读取共享结果，不存在时只由持有租约的进程调用builder生成，其他进程轮询等待
+        
+        持有租约的进程崩溃时租约在timeout后过期，由其他进程接管；
+        等待超过timeout仍无结果时当前进程自行生成。
+        """
+        deadline = time.monotonic() + timeout
+        waited = False
+        while True:
+            value = self.get(key)
+            if value is not None:
+                return value
+            if self.try_lease(key, timeout):
+                try:
+                    # 拿到租约前其他进程可能刚写入结果
+                    value = self.get(key)
+                    if value is None:
+                        value = builder()
+                        self.builds += 1
+                        self.set(key, value, ttl)
+                    return value
+                finally:
+                    self.release_lease(key)
+            if not waited:
+                waited = True
+                self.waits += 1
+                logger.info(f"Waiting for another worker to build {key}")
+            if time.monotonic() >= deadline:
+                logger.warning(f"Timed out waiting for {key}, building locally")
+                return builder()
+            time.sleep(SHARED_BUILD_POLL_INTERVAL)
+
+
 class Neo4jDatabase:
-    """Neo4j数据库连接管理"""
+    """Neo4j数据库连接管理
+    
+    驱动在首次查询时才创建；连接中断时按指数退避自动重连。
+    """
     
     def __init__(self, uri: str, username: str, password: str):
         self.uri = uri
         self.username = username
         self.password = password
         self.driver = None
+        self.cache = QueryCache()
+        self.shared_cache: Optional[SharedCache] = None
+        self.flights = SingleFlight()
+        self.last_error: Optional[str] = None
+        self.last_connected_at: Optional[float] = None
+        self.reconnect_count = 0
+        self._lock = threading.Lock()
         
     def connect(self):
-        """连接到Neo4j数据库"""
+        """连接到Neo4j数据库（失败时按指数退避重试）"""
+        self._with_retry(lambda driver: driver.verify_connectivity())
+        logger.info("Successfully connected to Neo4j database")
+    
+    def _get_driver(self):
+        """惰性创建驱动"""
+        if self.driver is None:
+            with self._lock:
+                if self.driver is None:
+                    self.driver = GraphDatabase.driver(
+                        self.uri, 
+                        auth=(self.username, self.password)
+                    )
+        return self.driver
+    
+    def _reset_driver(self):
+        """丢弃失效的驱动，下次查询时重新创建"""
+        with self._lock:
+            driver, self.driver = self.driver, None
+        if driver:
+            try:
+                driver.close()
+            except Exception:
+                pass
+    
+    def _with_retry(self, operation):
+        """执行数据库操作，连接类错误按指数退避重试"""
+        for attempt in range(1, RECONNECT_MAX_ATTEMPTS + 1):
+            try:
+                result = operation(self._get_driver())
+                if self.last_connected_at is None or self.last_error:
+                    self.last_connected_at = time.time()
+                self.last_error = None
+                return result
+            except AuthError as e:
+                self.last_error = str(e)
+                raise
+            except (ServiceUnavailable, SessionExpired, OSError) as e:
+                self.last_error = str(e)
+                self._reset_driver()
+                if attempt == RECONNECT_MAX_ATTEMPTS:
+                    logger.error(f"Neo4j unavailable after {attempt} attempts: {e}")
+                    raise
+                delay = min(RECONNECT_BASE_DELAY * (2 ** (attempt - 1)), RECONNECT_MAX_DELAY)
+                delay *= random.uniform(0.8, 1.2)
+                self.reconnect_count += 1
+                logger.warning(f"Neo4j connection lost ({e}), retrying in {delay:.1f}s "
+                               f"(attempt {attempt}/{RECONNECT_MAX_ATTEMPTS})")
+                time.sleep(delay)
+    
+    def run_with_driver(self, operation: Callable[[Any], Any]) -> Any:
+        """以驱动为参数执行自定义操作（如流式导出），连接类错误按指数退避重试"""
+        return self._with_retry(operation)
+    
+    def ping(self):
+        """单次探测数据库是否可用（不重试），失败时抛出异常"""
         try:
-            self.driver = GraphDatabase.driver(
-                self.uri, 
-                auth=(self.username, self.password)
-            )
-            # 测试连接
-            with self.driver.session() as session:
-                result = session.run("RETURN 1 as test")
-                result.single()
-            logger.info("Successfully connected to Neo4j database")
+            with self._get_driver().session() as session:
+                session.run("RETURN 1 as test").consume()
         except Exception as e:
-            logger.error(f"Failed to connect to Neo4j: {e}")
+            self.last_error = str(e)
             raise
+        if self.last_connected_at is None or self.last_error:
+            self.last_connected_at = time.time()
+        self.last_error = None
     
     def close(self):
         """关闭数据库连接"""
-        if self.driver:
-            self.driver.close()
+        self._reset_driver()
+    
+    @property
+    def is_connected(self) -> bool:
+        return self.driver is not None and self.last_error is None and self.last_connected_at is not None
     
-    def run_query(self, query: str, parameters: Optional[Dict] = None) -> List[Dict]:
-        """执行Cypher查询"""
-        if not self.driver:
-            raise Exception("Not connected to Neo4j database")
+    def run_query(self, query: str, parameters: Optional[Dict] = None,
+                  on_execute: Optional[Callable[[], None]] = None) -> List[Dict]:
+        """执行Cypher查询
+        
+        相同查询语句和参数的并发调用会合并为一次执行，共享同一结果。
+        on_execute 只在查询真正发送到数据库时调用一次（合并的调用不会触发）。
+        """
+        def operation(driver):
+            with driver.session() as session:
+                result = session.run(query, parameters or {})
+                return [record.data() for record in result]
+        
+        def execute():
+            if on_execute is not None:
+                on_execute()
+            return self._with_retry(operation)
         
         try:
-                with self.driver.session() as session:
-                    result = session.run(query, parameters or {})
-                    return [record.data() for record in result]
+            key = QueryCache.make_key(query, parameters)
+            return list(self.flights.do(key, execute))
         except Exception as e:
             logger.error(f"Query execution failed: {e}")
             raise
+    
+    def sample_nodes(self, label: str, projection: str, count: int,
+                     sample_size: int = SCHEMA_SAMPLE_SIZE,
+                     scan_limit: int = SCHEMA_SCAN_LIMIT) -> Tuple[List[Dict], bool]:
+        """在服务端对标签下的节点做伯努利抽样，只传回约sample_size条记录
+        
+        最多读取scan_limit个节点，耗时与图规模无关；节点数超过scan_limit时
+        样本只来自存储顺序靠前的节点。
+        
+        Args:
+            label: 节点标签
+            projection: 对节点变量n的RETURN表达式，例如 "keys(n) as keys"
+            count: 标签下的节点数（来自计数存储），用于确定抽样概率
+            sample_size: 期望的样本数
+            scan_limit: 最多读取的节点数
+        
+        Returns:
+            (样本记录, 样本是否只覆盖部分节点而可能有偏差)
+        """
+        scanned = min(count, scan_limit)
+        probability = min(1.0, sample_size / scanned) if scanned else 1.0
+        rows = self.run_query(
+            f"MATCH (n:{label}) WITH n LIMIT $scan_limit "
+            f"WITH n WHERE rand() < $probability RETURN {projection} LIMIT $sample_size",
+            {"scan_limit": scan_limit, "probability": probability, "sample_size": sample_size}
+        )
+        return rows, count > scan_limit
+    
+    def cached_query(self, query: str, parameters: Optional[Dict] = None,
+                     on_execute: Optional[Callable[[], None]] = None) -> List[Dict]:
+        """执行只读查询，依次查找进程内缓存和共享缓存，都未命中时才访问数据库"""
+        key = QueryCache.make_key(query, parameters)
+        results = self.cache.get(key)
+        if results is None and self.shared_cache is not None:
+            results = self.shared_cache.get("query:" + key)
+            if results is not None:
+                self.cache.set(key, results)
+        if results is None:
+            results = self.run_query(query, parameters, on_execute)
+            self.cache.set(key, results)
+            if self.shared_cache is not None:
+                self.shared_cache.set("query:" + key, results)
+        return results
 
 # 初始化数据库连接
 db = Neo4jDatabase(NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD)
@@ -76,8 +1030,21 @@ db = Neo4jDatabase(NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD)
 # 创建FastMCP实例
 mcp = FastMCP("Neo4j知识图谱")
 
+plan_cache = PlanCacheTracker()
+admission = AdmissionController()
+
+# 服务器运行状态（供健康检查使用）
+server_state = {
+    "started_at": time.time(),
+    "warmup": "pending" if WARMUP_ON_START else "disabled",
+    "warmup_seconds": None,
+    "schema_description": None,
+    "schema_description_at": 0.0,
+}
+
 @mcp.tool()
-def run_cypher_query(query: str, parameters: Optional[Dict] = None) -> str:
+@admission_controlled(PRIORITY_LOW)
+def run_cypher_query(query: str, parameters: Optional[Dict] = None, full_properties: bool = False) -> str:
     """执行自定义Cypher查询语句
     
     允许执行任何只读的Cypher查询来探索和分析知识图谱数据。
@@ -86,6 +1053,9 @@ def run_cypher_query(query: str, parameters: Optional[Dict] = None) -> str:
     Args:
         query: 要执行的Cypher查询语句，支持MATCH、RETURN、WITH、WHERE等只读操作
         parameters: 查询参数字典，用于参数化查询以提高安全性和性能
+                    （WHERE条件中内联的字面量也会被自动提取为参数）
+        full_properties: 为False时直接返回的节点只包含id/name/type和描述预览，
+                         完整描述请使用 get_node_details 按id获取
     
     Returns:
         查询结果的格式化文本，包含所有字段和记录数据
@@ -107,7 +1077,15 @@ def run_cypher_query(query: str, parameters: Optional[Dict] = None) -> str:
             return f"错误：出于安全考虑，不允许执行包含 '{keyword}' 的查询。请使用只读操作如MATCH、RETURN、WHERE等。"
     
     try:
-        results = db.run_query(query, parameters or {})
+        on_execute = None
+        if PARAMETERIZE_LITERALS:
+            rewritten, parameters, lifted = parameterize_literals(query, parameters)
+            # 只统计真正发送到数据库的查询
+            on_execute = functools.partial(plan_cache.record, query, rewritten, lifted)
+            query = rewritten
+        if PROJECT_NODE_RESULTS and not full_properties:
+            query, _ = project_node_returns(query)
+        results = db.cached_query(query, parameters or {}, on_execute)
         
         if not results:
             return "查询成功执行，但未返回任何结果。"
@@ -146,6 +1124,7 @@ def run_cypher_query(query: str, parameters: Optional[Dict] = None) -> str:
         return f"❌ 查询执行失败: {str(e)}\n\n💡 提示：请检查Cypher语法是否正确，确保引用的节点、关系和属性名称存在。"
 
 @mcp.tool()
+@admission_controlled(PRIORITY_HIGH)
 def explain_database_structure() -> str:
     """解释德国家族企业知识图谱的完整结构和schema信息
     
@@ -156,57 +1135,168 @@ def explain_database_structure() -> str:
         知识图谱的完整结构说明，包含所有必要信息用于智能查询构造
     """
     try:
-        structure_info = []
+        return get_schema_description()
         
-        # 添加知识图谱的领域背景
+    except Exception as e:
+        return f"❌ 获取数据库结构信息失败: {str(e)}\n\n💡 请确保数据库连接正常且包含德国家族企业知识图谱数据。"
+
+def get_schema_description() -> str:
+    """获取schema说明：优先使用进程内缓存，其次是多worker共享缓存，超过TTL后重新生成"""
+    expired = time.monotonic() - server_state["schema_description_at"] > SCHEMA_DESCRIPTION_TTL
+    if server_state["schema_description"] is None or expired:
+        if db.shared_cache is not None:
+            # 多worker时只由一个进程生成，其他进程等待共享缓存中的结果
+            description = db.flights.do("schema:description", lambda: db.shared_cache.get_or_build(
+                "schema:description", build_database_structure, ttl=SCHEMA_DESCRIPTION_TTL))
+        else:
+            description = db.flights.do("schema:description", build_database_structure)
+        server_state["schema_description"] = description
+        server_state["schema_description_at"] = time.monotonic()
+    return server_state["schema_description"]
+
+def _node_property_types() -> Dict[str, Dict[str, str]]:
+    """通过 db.schema.nodeTypeProperties() 获取每个标签的属性名及类型"""
+    try:
+        rows = db.run_query("""
+        CALL db.schema.nodeTypeProperties()
+        YIELD nodeLabels, propertyName, propertyTypes
+        RETURN nodeLabels, propertyName, propertyTypes
+        """)
+    except Exception as e:
+        logger.warning(f"db.schema.nodeTypeProperties() unavailable: {e}")
+        return {}
+    
+    property_types: Dict[str, Dict[str, str]] = {}
+    for row in rows:
+        if not row['propertyName']:
+            continue
+        for label in row['nodeLabels'] or []:
+            property_types.setdefault(label, {})[row['propertyName']] = "|".join(row['propertyTypes'] or [])
+    return property_types
+
+def _rel_property_types() -> Dict[str, Dict[str, str]]:
+    """通过 db.schema.relTypeProperties() 获取每种关系的属性名及类型"""
+    try:
+        rows = db.run_query("""
+        CALL db.schema.relTypeProperties()
+        YIELD relType, propertyName, propertyTypes
+        RETURN relType, propertyName, propertyTypes
+        """)
+    except Exception as e:
+        logger.warning(f"db.schema.relTypeProperties() unavailable: {e}")
+        return {}
+    
+    property_types: Dict[str, Dict[str, str]] = {}
+    for row in rows:
+        if row['propertyName']:
+            # relType 形如 ":`CONTAINS`"
+            rel_type = row['relType'].lstrip(':').strip('`')
+            property_types.setdefault(rel_type, {})[row['propertyName']] = "|".join(row['propertyTypes'] or [])
+    return property_types
+
+def _extrapolate(counter: Dict[Any, int], sample_count: int, total: int) -> List[Tuple[Any, int]]:
+    """将样本中的频次按比例换算为全量估计值"""
+    if not sample_count:
+        return []
+    scale = total / sample_count if total else 1
+    return sorted(((k, round(v * scale)) for k, v in counter.items()), key=lambda kv: -kv[1])
+
+def _estimate_note(approximate: bool, biased: bool) -> str:
+    """抽样结果的标注"""
+    if biased:
+        return f"（抽样估计，仅基于前 {SCHEMA_SCAN_LIMIT:,} 个节点，可能有偏差）:"
+    return "（抽样估计）:" if approximate else ":"
+
+def _sample_property_frequencies(label: str, count: int) -> Tuple[List[Dict], bool, bool]:
+    """对标签下的节点进行抽样并估计各属性的出现频次
+    
+    Returns:
+        (属性频次列表, 是否为估计值, 样本是否可能有偏差)
+    """
+    sample, biased = db.sample_nodes(label, "keys(n) as keys", count)
+    frequencies: Dict[str, int] = {}
+    for row in sample:
+        for key in row['keys']:
+            frequencies[key] = frequencies.get(key, 0) + 1
+    
+    approximate = len(sample) < count
+    estimates = _extrapolate(frequencies, len(sample), count if approximate else len(sample))
+    return [{"key": k, "frequency": v} for k, v in estimates[:10]], approximate, biased
+
+def _sample_type_distribution() -> Tuple[List[Dict], bool, bool]:
+    """抽样估计 Node 标签下 type 属性的分布（节点数来自计数存储，不扫描）"""
+    count_result = db.run_query("MATCH (n:Node) RETURN count(n) as count")
+    count = count_result[0]['count'] if count_result else 0
+    sample, biased = db.sample_nodes("Node", "n.type as node_type", count)
+    distribution: Dict[Any, int] = {}
+    typed = 0
+    for row in sample:
+        if row['node_type'] is not None:
+            typed += 1
+            distribution[row['node_type']] = distribution.get(row['node_type'], 0) + 1
+    
+    approximate = len(sample) < count
+    total = round(typed / len(sample) * count) if approximate and sample else typed
+    distribution_list = [{"node_type": k, "count": v} for k, v in _extrapolate(distribution, typed, total)]
+    return distribution_list, approximate, biased
+
+def build_database_structure() -> str:
+    """查询数据库并生成知识图谱结构说明文本"""
+    structure_info = []
+    
+    # 添加知识图谱的领域背景
+    structure_info.extend([
+        "🏢 德国家族企业知识图谱数据库",
+        "=" * 50,
+        "",
+        "📖 数据库简介:",
+        "本数据库包含德国家族企业相关的结构化知识，涵盖企业管理、创新、传承、",
+        "治理结构等多个维度的内容。数据按照层次化结构组织。",
+        "",
+    ])
+    
+    sampled = SCHEMA_STATS_MODE == "sampled"
+    
+    # 1. 获取基本统计信息（无过滤条件的count直接读取计数存储）
+    total_nodes = db.run_query("MATCH (n) RETURN count(n) as count")
+    total_relationships = db.run_query("MATCH ()-[r]->() RETURN count(r) as count")
+    
+    if total_nodes and total_relationships:
         structure_info.extend([
-            "🏢 德国家族企业知识图谱数据库",
-            "=" * 50,
-            "",
-            "📖 数据库简介:",
-            "本数据库包含德国家族企业相关的结构化知识，涵盖企业管理、创新、传承、",
-            "治理结构等多个维度的内容。数据按照层次化结构组织。",
+            "📊 数据库统计:",
+            f"  • 节点总数: {total_nodes[0]['count']:,}",
+            f"  • 关系总数: {total_relationships[0]['count']:,}",
             "",
         ])
+    
+    # 属性名称和类型来自内置schema过程，避免逐节点读取属性
+    node_property_types = _node_property_types() if sampled else {}
+    rel_property_types = _rel_property_types() if sampled else {}
+    
+    # 2. 详细的节点标签信息和示例
+    labels_query = """
+    CALL db.labels() YIELD label
+    RETURN collect(label) as labels
+    """
+    labels_result = db.run_query(labels_query)
+    
+    if labels_result and labels_result[0]['labels']:
+        structure_info.append("🏷️ 节点类型详情:")
+        structure_info.append("")
         
-        # 1. 获取基本统计信息
-        stats_query = """
-        MATCH (n)
-        WITH count(n) as total_nodes
-        MATCH ()-[r]->()
-        WITH total_nodes, count(r) as total_relationships
-        RETURN total_nodes, total_relationships
-        """
-        stats = db.run_query(stats_query)
-        
-        if stats:
-            structure_info.extend([
-                "📊 数据库统计:",
-                f"  • 节点总数: {stats[0]['total_nodes']:,}",
-                f"  • 关系总数: {stats[0]['total_relationships']:,}",
-                "",
-            ])
-        
-        # 2. 详细的节点标签信息和示例
-        labels_query = """
-        CALL db.labels() YIELD label
-        RETURN collect(label) as labels
-        """
-        labels_result = db.run_query(labels_query)
-        
-        if labels_result and labels_result[0]['labels']:
-            structure_info.append("🏷️ 节点类型详情:")
-            structure_info.append("")
+        for label in labels_result[0]['labels']:
+            # 获取每个标签的节点数量
+            count_query = f"MATCH (n:{label}) RETURN count(n) as count"
+            count_result = db.run_query(count_query)
+            count = count_result[0]['count'] if count_result else 0
+            
+            structure_info.append(f"📌 {label} 类型 ({count:,} 个节点)")
             
-            for label in labels_result[0]['labels']:
-                # 获取每个标签的节点数量
-                count_query = f"MATCH (n:{label}) RETURN count(n) as count"
-                count_result = db.run_query(count_query)
-                count = count_result[0]['count'] if count_result else 0
-                
-                structure_info.append(f"📌 {label} 类型 ({count:,} 个节点)")
-                
-                # 获取该类型节点的属性信息
+            # 获取该类型节点的属性信息
+            biased = False
+            if sampled:
+                props_result, approximate, biased = _sample_property_frequencies(label, count)
+            else:
                 props_query = f"""
                 MATCH (n:{label})
                 WITH keys(n) as node_keys
@@ -215,161 +1305,694 @@ def explain_database_structure() -> str:
                 ORDER BY frequency DESC
                 LIMIT 10
                 """
-                props_result = db.run_query(props_query)
-                
-                if props_result:
-                    structure_info.append("  属性字段:")
-                    for prop in props_result:
-                        structure_info.append(f"    • {prop['key']} (出现在 {prop['frequency']} 个节点中)")
-                
-                # 获取该类型的具体数据示例
-                example_query = f"MATCH (n:{label}) RETURN n LIMIT 3"
-                examples = db.run_query(example_query)
-                
-                if examples:
-                    structure_info.append("  数据样例:")
-                    for i, example in enumerate(examples, 1):
-                        node_data = example['n']
-                        structure_info.append(f"    样例 {i}:")
-                        # 重点显示name, type, description
-                        important_fields = ['name', 'type', 'description']
-                        for field in important_fields:
-                            if field in node_data:
-                                value = str(node_data[field])
-                                if len(value) > 80:
-                                    value = value[:80] + "..."
-                                structure_info.append(f"      {field}: {value}")
-                
-                structure_info.append("")
-        
-        # 3. 详细的关系类型信息和示例
-        rel_types_query = """
-        CALL db.relationshipTypes() YIELD relationshipType
-        RETURN collect(relationshipType) as types
-        """
-        rel_types_result = db.run_query(rel_types_query)
-        
-        if rel_types_result and rel_types_result[0]['types']:
-            structure_info.append("🔗 关系类型详情:")
-            structure_info.append("")
+                props_result, approximate = db.run_query(props_query), False
             
-            for rel_type in rel_types_result[0]['types']:
-                # 获取每种关系类型的数量
-                count_query = f"MATCH ()-[r:{rel_type}]->() RETURN count(r) as count"
-                count_result = db.run_query(count_query)
-                count = count_result[0]['count'] if count_result else 0
-                
-                structure_info.append(f"🔗 {rel_type} 关系 ({count:,} 个)")
-                
-                # 获取关系的具体示例和连接模式
-                rel_example_query = f"""
-                MATCH (a)-[r:{rel_type}]->(b)
-                RETURN labels(a) as source_labels, a.name as source_name, a.type as source_type,
-                       labels(b) as target_labels, b.name as target_name, b.type as target_type,
-                       properties(r) as rel_props
-                LIMIT 3
-                """
-                rel_examples = db.run_query(rel_example_query)
-                
-                if rel_examples:
-                    structure_info.append("  连接模式和示例:")
-                    for i, rel_ex in enumerate(rel_examples, 1):
-                        source_label = rel_ex['source_labels'][0] if rel_ex['source_labels'] else 'Unknown'
-                        target_label = rel_ex['target_labels'][0] if rel_ex['target_labels'] else 'Unknown'
-                        structure_info.append(f"    示例 {i}: ({source_label})-[{rel_type}]->({target_label})")
-                        structure_info.append(f"      源节点: {rel_ex['source_name']} (type: {rel_ex['source_type']})")
-                        structure_info.append(f"      目标节点: {rel_ex['target_name']} (type: {rel_ex['target_type']})")
-                        
-                        if rel_ex['rel_props']:
-                            structure_info.append(f"      关系属性: {rel_ex['rel_props']}")
-                
-                structure_info.append("")
-        
-        # 4. 数据组织层次结构
-        structure_info.extend([
-            "📋 数据组织层次:",
-            "",
-            "根据数据样例，知识图谱采用层次化组织结构：",
-        ])
+            if props_result:
+                structure_info.append("  属性字段" + _estimate_note(approximate, biased))
+                property_types = node_property_types.get(label, {})
+                for prop in props_result:
+                    type_hint = f": {property_types[prop['key']]}" if prop['key'] in property_types else ""
+                    structure_info.append(
+                        f"    • {prop['key']}{type_hint} (出现在{'约 ' if approximate else ' '}"
+                        f"{prop['frequency']} 个节点中)"
+                    )
+            
+            # 获取该类型的具体数据示例
+            example_query = f"MATCH (n:{label}) RETURN n LIMIT 3"
+            examples = db.run_query(example_query)
+            
+            if examples:
+                structure_info.append("  数据样例:")
+                for i, example in enumerate(examples, 1):
+                    node_data = example['n']
+                    structure_info.append(f"    样例 {i}:")
+                    # 重点显示name, type, description
+                    important_fields = ['name', 'type', 'description']
+                    for field in important_fields:
+                        if field in node_data:
+                            value = str(node_data[field])
+                            if len(value) > 80:
+                                value = value[:80] + "..."
+                            structure_info.append(f"      {field}: {value}")
+            
+            structure_info.append("")
+    
+    # 3. 详细的关系类型信息和示例
+    rel_types_query = """
+    CALL db.relationshipTypes() YIELD relationshipType
+    RETURN collect(relationshipType) as types
+    """
+    rel_types_result = db.run_query(rel_types_query)
+    
+    if rel_types_result and rel_types_result[0]['types']:
+        structure_info.append("🔗 关系类型详情:")
+        structure_info.append("")
         
-        # 获取层次结构信息
+        for rel_type in rel_types_result[0]['types']:
+            # 获取每种关系类型的数量
+            count_query = f"MATCH ()-[r:{rel_type}]->() RETURN count(r) as count"
+            count_result = db.run_query(count_query)
+            count = count_result[0]['count'] if count_result else 0
+            
+            structure_info.append(f"🔗 {rel_type} 关系 ({count:,} 个)")
+            
+            if rel_property_types.get(rel_type):
+                structure_info.append("  关系属性: " + ", ".join(
+                    f"{name}: {types}" for name, types in rel_property_types[rel_type].items()
+                ))
+            
+            # 获取关系的具体示例和连接模式
+            rel_example_query = f"""
+            MATCH (a)-[r:{rel_type}]->(b)
+            RETURN labels(a) as source_labels, a.name as source_name, a.type as source_type,
+                   labels(b) as target_labels, b.name as target_name, b.type as target_type,
+                   properties(r) as rel_props
+            LIMIT 3
+            """
+            rel_examples = db.run_query(rel_example_query)
+            
+            if rel_examples:
+                structure_info.append("  连接模式和示例:")
+                for i, rel_ex in enumerate(rel_examples, 1):
+                    source_label = rel_ex['source_labels'][0] if rel_ex['source_labels'] else 'Unknown'
+                    target_label = rel_ex['target_labels'][0] if rel_ex['target_labels'] else 'Unknown'
+                    structure_info.append(f"    示例 {i}: ({source_label})-[{rel_type}]->({target_label})")
+                    structure_info.append(f"      源节点: {rel_ex['source_name']} (type: {rel_ex['source_type']})")
+                    structure_info.append(f"      目标节点: {rel_ex['target_name']} (type: {rel_ex['target_type']})")
+                    
+                    if rel_ex['rel_props']:
+                        structure_info.append(f"      关系属性: {rel_ex['rel_props']}")
+            
+            structure_info.append("")
+    
+    # 4. 数据组织层次结构
+    structure_info.extend([
+        "📋 数据组织层次:",
+        "",
+        "根据数据样例，知识图谱采用层次化组织结构：",
+    ])
+    
+    # 获取层次结构信息
+    biased = False
+    if sampled:
+        hierarchy_result, approximate, biased = _sample_type_distribution()
+    else:
         hierarchy_query = """
         MATCH (n:Node)
         WHERE n.type IS NOT NULL
         RETURN DISTINCT n.type as node_type, count(n) as count
         ORDER BY count DESC
         """
-        hierarchy_result = db.run_query(hierarchy_query)
+        hierarchy_result, approximate = db.run_query(hierarchy_query), False
+    
+    if hierarchy_result:
+        structure_info.append("  节点类型分布" + _estimate_note(approximate, biased))
+        for hier in hierarchy_result:
+            structure_info.append(f"    • {hier['node_type']}: {'约 ' if approximate else ''}{hier['count']} 个节点")
+        structure_info.append("")
+    
+    # 5. 获取具体的节点名称样例帮助理解内容结构（抽样模式下只在有限的节点中挑选）
+    name_pattern_query = f"""
+    MATCH (n:Node)
+    WHERE n.name IS NOT NULL AND n.type IS NOT NULL
+    {'WITH n LIMIT $scan_limit' if sampled else ''}
+    RETURN DISTINCT n.name, n.type
+    ORDER BY n.type, n.name
+    LIMIT 20
+    """
+    name_patterns = db.run_query(name_pattern_query, {"scan_limit": SCHEMA_SCAN_LIMIT})
+    
+    if name_patterns:
+        structure_info.extend([
+            "📝 节点名称和类型样例:",
+            ""
+        ])
         
-        if hierarchy_result:
-            structure_info.append("  节点类型分布:")
-            for hier in hierarchy_result:
-                structure_info.append(f"    • {hier['node_type']}: {hier['count']} 个节点")
-            structure_info.append("")
+        current_type = None
+        for pattern in name_patterns:
+            if pattern['type'] != current_type:
+                current_type = pattern['type']
+                structure_info.append(f"  {pattern['type']} 类型:")
+            structure_info.append(f"    • {pattern['name']}")
         
-        # 5. 获取具体的节点名称样例帮助理解内容结构
-        name_pattern_query = """
-        MATCH (n:Node)
-        WHERE n.name IS NOT NULL AND n.type IS NOT NULL
-        RETURN DISTINCT n.name, n.type
-        ORDER BY n.type, n.name
-        LIMIT 20
+        structure_info.append("")
+    
+    # 6. 关键领域术语
+    structure_info.extend([
+        "📚 德国家族企业关键概念:",
+        "",
+        "• Familienunternehmen: 家族企业",
+        "• Innovation: 创新",
+        "• Nachfolge: 企业传承",
+        "• Governance: 治理结构", 
+        "• Mittelstand: 中小企业",
+        "• Unternehmensführung: 企业管理",
+        "• Digitalisierung: 数字化",
+        "",
+        "🎯 推荐查询方式:",
+        "• 使用 n.name CONTAINS '关键词' 进行内容搜索",
+        "• 使用 n.type = '类型名' 进行精确类型过滤",
+        "• 结合 WHERE n.type = '类型' AND n.name CONTAINS '关键词'",
+        "• description字段包含详细内容，适合全文搜索",
+        "• 关系查询使用节点的name和type字段进行定位",
+        "",
+        "现在你可以使用 run_cypher_query 工具基于以上结构信息构造查询！",
+        "="*50
+    ])
+    
+    return "\n".join(structure_info)
+
+class AdjacencyCache:
+    """热点节点邻接表的LRU缓存，按 (节点id, 关系类型过滤) 缓存"""
+    
+    def __init__(self, max_size: int = ADJACENCY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL):
+        self._cache = QueryCache(max_size, ttl)
+    
+    @staticmethod
+    def _key(node_id: str, rel_types: Optional[Tuple[str, ...]]) -> str:
+        return node_id + "\x00" + ",".join(rel_types or ())
+    
+    def get_many(self, node_ids: List[str], rel_types: Optional[Tuple[str, ...]]) -> Tuple[Dict[str, Dict], List[str]]:
+        """返回 (命中的邻接表, 未命中的节点id)"""
+        found, missing = {}, []
+        for node_id in node_ids:
+            entry = self._cache.get(self._key(node_id, rel_types))
+            if entry is None:
+                missing.append(node_id)
+            else:
+                found[node_id] = entry
+        return found, missing
+    
+    def fetch(self, node_ids: List[str], rel_types: Optional[Tuple[str, ...]]) -> Dict[str, Dict]:
+        """批量获取节点邻接表，只对未命中的节点查询数据库
+        
+        每个节点的边在子查询中读到 limit+1 条即停止，高出度节点在服务端的展开量也有上限；
+        排序只作用于这些已限量的边。
         """
-        name_patterns = db.run_query(name_pattern_query)
+        found, missing = self.get_many(node_ids, rel_types)
+        if missing:
+            rows = db.run_query(f"""
+            UNWIND $ids AS node_id
+            MATCH (a:{NODE_LABEL} {{id: node_id}})
+            CALL {{
+                WITH a
+                OPTIONAL MATCH (a)-[r]-(b)
+                WHERE $rel_types IS NULL OR type(r) IN $rel_types
+                RETURN r, b
+                LIMIT $fetch_limit
+            }}
+            WITH a, node_id, r, b
+            ORDER BY type(r), b.id
+            WITH a, node_id, collect(CASE WHEN r IS NULL THEN NULL ELSE {{
+                rel_type: type(r), outgoing: startNode(r) = a,
+                id: b.id, name: b.name, type: b.type
+            }} END) AS edges
+            RETURN node_id, a.name AS name, a.type AS type,
+                   edges[..$limit] AS edges, size(edges) > $limit AS truncated
+            """, {"ids": missing, "rel_types": list(rel_types) if rel_types else None,
+                  "limit": ADJACENCY_FETCH_LIMIT, "fetch_limit": ADJACENCY_FETCH_LIMIT + 1})
+            for row in rows:
+                entry = {"name": row["name"], "type": row["type"],
+                         "edges": row["edges"], "truncated": row["truncated"]}
+                self._cache.set(self._key(row["node_id"], rel_types), entry)
+                found[row["node_id"]] = entry
+        return found
+    
+    @property
+    def hits(self) -> int:
+        return self._cache.hits
+    
+    @property
+    def misses(self) -> int:
+        return self._cache.misses
+    
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+adjacency_cache = AdjacencyCache()
+
+@mcp.tool()
+@admission_controlled(PRIORITY_HIGH)
+def get_node_details(ids: List[str]) -> str:
+    """按id批量获取节点的完整信息（包括完整的description）
+    
+    run_cypher_query 默认只返回节点的id/name/type和描述预览，
+    需要完整内容时使用本工具，一次可查询多个节点。
+    
+    Args:
+        ids: 节点id列表（例如 ['part1', 'part1_basic_data']），最多50个
+    
+    Returns:
+        每个节点的全部属性以及出入关系数量
+    """
+    ids = [node_id for node_id in dict.fromkeys(ids or []) if node_id]
+    if not ids:
+        return "错误：节点id列表不能为空"
+    if len(ids) > MAX_DETAIL_IDS:
+        return f"错误：一次最多查询 {MAX_DETAIL_IDS} 个节点"
+    
+    try:
+        results = db.cached_query(f"""
+        UNWIND $ids AS node_id
+        MATCH (n:{NODE_LABEL} {{id: node_id}})
+        RETURN node_id, properties(n) AS properties,
+               size([(n)-->() | 1]) AS out_degree, size([(n)<--() | 1]) AS in_degree
+        """, {"ids": ids})
         
-        if name_patterns:
-            structure_info.extend([
-                "📝 节点名称和类型样例:",
-                ""
-            ])
-            
-            current_type = None
-            for pattern in name_patterns:
-                if pattern['type'] != current_type:
-                    current_type = pattern['type']
-                    structure_info.append(f"  {pattern['type']} 类型:")
-                structure_info.append(f"    • {pattern['name']}")
+        found = {row["node_id"]: row for row in results}
+        response = f"📄 节点详情（找到 {len(found)}/{len(ids)} 个）：\n\n"
+        for node_id in ids:
+            row = found.get(node_id)
+            if row is None:
+                response += f"❓ {node_id}: 未找到\n\n"
+                continue
+            response += f"📍 {node_id} (出边 {row['out_degree']} / 入边 {row['in_degree']}):\n"
+            for key, value in row["properties"].items():
+                if isinstance(value, (list, dict)):
+                    value = json.dumps(value, ensure_ascii=False)
+                response += f"  • {key}: {value}\n"
+            response += "\n"
+        return response
+        
+    except Exception as e:
+        return f"❌ 获取节点详情失败: {str(e)}"
+
+@mcp.tool()
+@admission_controlled(PRIORITY_HIGH)
+def get_neighborhood(id: str, depth: int = 1, max_per_hop: int = 10,
+                     rel_types: Optional[List[str]] = None) -> str:
+    """获取节点的k跳邻域（ego网络）
+    
+    一次调用即可完成多跳探索，每个节点每跳最多展开 max_per_hop 个邻居，
+    避免root等高出度节点返回海量结果。常访问节点的邻接表会被缓存。
+    
+    Args:
+        id: 起始节点的id（例如 'root'、'part1'）
+        depth: 扩展跳数，1-3
+        max_per_hop: 每个节点每跳最多展开的邻居数，1-50
+        rel_types: 仅沿这些关系类型扩展（例如 ['CONTAINS', 'INCLUDES']），默认全部
+    
+    Returns:
+        按跳数分组的邻居节点及连接关系
+    """
+    if not id or not id.strip():
+        return "错误：节点id不能为空"
+    depth = max(1, min(depth, MAX_NEIGHBORHOOD_DEPTH))
+    max_per_hop = max(1, min(max_per_hop, MAX_NEIGHBORS_PER_HOP))
+    rel_filter = tuple(sorted(rel_types)) if rel_types else None
+    
+    try:
+        start = adjacency_cache.fetch([id], rel_filter).get(id)
+        if start is None:
+            return f"未找到id为 '{id}' 的节点。"
+        
+        visited = {id: start}
+        frontier = [id]
+        hops: List[List[str]] = []
+        truncated_nodes = 0
+        node_cap_reached = False
+        
+        for _ in range(depth):
+            adjacency = adjacency_cache.fetch(frontier, rel_filter)
+            lines = []
+            next_frontier = []
+            # 指回前几跳已访问节点的边不再展开，也不占用每跳的配额
+            seen_before = set(visited)
+            for node_id in frontier:
+                entry = adjacency.get(node_id)
+                if entry is None:
+                    continue
+                edges = [edge for edge in entry["edges"] if edge["id"] not in seen_before]
+                if entry["truncated"] or len(edges) > max_per_hop:
+                    truncated_nodes += 1
+                for edge in edges[:max_per_hop]:
+                    # 达到节点上限后不再加入新节点，指向它们的边也不输出
+                    if edge["id"] not in visited:
+                        if len(visited) >= MAX_NEIGHBORHOOD_NODES:
+                            node_cap_reached = True
+                            continue
+                        visited[edge["id"]] = {"name": edge["name"], "type": edge["type"]}
+                        next_frontier.append(edge["id"])
+                    if edge["outgoing"]:
+                        lines.append(f"  ({node_id})-[{edge['rel_type']}]->({edge['id']})")
+                    else:
+                        lines.append(f"  ({node_id})<-[{edge['rel_type']}]-({edge['id']})")
+            hops.append(lines)
+            frontier = next_frontier
+            if not frontier:
+                break
+        
+        response = f"🕸️ 节点 {id} ({start['name']}, type: {start['type']}) 的 {depth} 跳邻域，"
+        response += f"共 {len(visited) - 1} 个邻居节点：\n\n"
+        for hop, lines in enumerate(hops, 1):
+            response += f"📍 第 {hop} 跳 ({len(lines)} 条关系):\n"
+            response += "\n".join(lines) + "\n\n" if lines else "  (无)\n\n"
+        
+        response += "📋 节点信息:\n"
+        for node_id, info in visited.items():
+            response += f"  • {node_id}: {info['name']} (type: {info['type']})\n"
+        
+        if truncated_nodes:
+            response += f"\n⚠️ 有 {truncated_nodes} 个节点的邻居超过上限未完全展开，可增大 max_per_hop 或指定 rel_types\n"
+        if node_cap_reached:
+            response += (f"\n⚠️ 邻域节点数已达上限 {MAX_NEIGHBORHOOD_NODES}，其余节点及指向它们的关系未列出，"
+                         f"可减小 depth/max_per_hop 或指定 rel_types\n")
+        return response
+        
+    except Exception as e:
+        return f"❌ 获取邻域失败: {str(e)}"
+
+def _bfs_expand(frontier: List[str], dist: Dict[str, int], parents: Dict[str, List[Tuple[str, Dict]]],
+                rel_filter: Optional[Tuple[str, ...]], names: Dict[str, str]) -> Tuple[List[str], bool]:
+    """BFS向外扩展一层，记录所有最短路径的前驱
+    
+    Returns:
+        (下一层节点, 是否有节点的邻接表被截断)
+    """
+    adjacency = adjacency_cache.fetch(frontier, rel_filter)
+    next_frontier = []
+    truncated = False
+    for node_id in frontier:
+        entry = adjacency.get(node_id)
+        if entry is None:
+            continue
+        truncated = truncated or entry["truncated"]
+        for edge in entry["edges"]:
+            neighbor = edge["id"]
+            if neighbor not in dist:
+                dist[neighbor] = dist[node_id] + 1
+                parents[neighbor] = []
+                names[neighbor] = edge["name"]
+                next_frontier.append(neighbor)
+            if dist[neighbor] == dist[node_id] + 1:
+                parents[neighbor].append((node_id, edge))
+    return next_frontier, truncated
+
+def _walk_back(node_id: str, parents: Dict[str, List[Tuple[str, Dict]]], limit: int):
+    """沿前驱回溯，生成从该侧起点到node_id的路径（节点与边交替的步骤列表）"""
+    if not parents.get(node_id):
+        yield []
+        return
+    produced = 0
+    for prev, edge in parents[node_id]:
+        for path in _walk_back(prev, parents, limit - produced):
+            yield path + [(prev, edge, node_id)]
+            produced += 1
+            if produced >= limit:
+                return
+
+@mcp.tool()
+@admission_controlled(PRIORITY_HIGH)
+def find_connections(source: str, target: str, max_hops: int = 4, k: int = 3,
+                     rel_types: Optional[List[str]] = None) -> str:
+    """查找两个节点之间的最短连接路径
+    
+    从两端同时进行广度优先搜索（双向BFS），忽略关系方向，返回最多k条最短路径。
+    搜索展开的节点数有硬上限，因此延迟可预测。
+    
+    Args:
+        source: 起点节点id
+        target: 终点节点id
+        max_hops: 路径最大长度，1-6
+        k: 最多返回的路径数，1-10
+        rel_types: 仅沿这些关系类型搜索，默认全部
+    
+    Returns:
+        最短路径列表，每条路径标注关系方向
+    """
+    if not source or not target:
+        return "错误：起点和终点id不能为空"
+    max_hops = max(1, min(max_hops, MAX_CONNECTION_HOPS))
+    k = max(1, min(k, MAX_CONNECTION_PATHS))
+    rel_filter = tuple(sorted(rel_types)) if rel_types else None
+    
+    try:
+        endpoints = adjacency_cache.fetch([source, target], rel_filter)
+        missing = [node_id for node_id in (source, target) if node_id not in endpoints]
+        if missing:
+            return f"未找到id为 {', '.join(repr(m) for m in missing)} 的节点。"
+        if source == target:
+            return f"起点和终点是同一个节点: {source}"
+        
+        names = {source: endpoints[source]["name"], target: endpoints[target]["name"]}
+        dist_s, dist_t = {source: 0}, {target: 0}
+        parents_s: Dict[str, List[Tuple[str, Dict]]] = {source: []}
+        parents_t: Dict[str, List[Tuple[str, Dict]]] = {target: []}
+        frontier_s, frontier_t = [source], [target]
+        depth_s = depth_t = 0
+        expanded = 0
+        truncated = False
+        meeting: List[str] = []
+        
+        while frontier_s and frontier_t and depth_s + depth_t < max_hops:
+            budget = MAX_CONNECTION_EXPANSIONS - expanded
+            if budget <= 0:
+                truncated = True
+                break
+            # 每次展开较小的一侧；超出剩余展开额度的节点不再展开
+            expand_source = len(frontier_s) <= len(frontier_t)
+            frontier = frontier_s if expand_source else frontier_t
+            if len(frontier) > budget:
+                frontier = frontier[:budget]
+                truncated = True
+            expanded += len(frontier)
+            if expand_source:
+                frontier_s, cut = _bfs_expand(frontier, dist_s, parents_s, rel_filter, names)
+                depth_s += 1
+            else:
+                frontier_t, cut = _bfs_expand(frontier, dist_t, parents_t, rel_filter, names)
+                depth_t += 1
+            truncated = truncated or cut
             
-            structure_info.append("")
+            common = set(dist_s) & set(dist_t)
+            if common:
+                best = min(dist_s[n] + dist_t[n] for n in common)
+                meeting = sorted(n for n in common if dist_s[n] + dist_t[n] == best)
+                break
         
-        # 6. 关键领域术语
-        structure_info.extend([
-            "📚 德国家族企业关键概念:",
-            "",
-            "• Familienunternehmen: 家族企业",
-            "• Innovation: 创新",
-            "• Nachfolge: 企业传承",
-            "• Governance: 治理结构", 
-            "• Mittelstand: 中小企业",
-            "• Unternehmensführung: 企业管理",
-            "• Digitalisierung: 数字化",
-            "",
-            "🎯 推荐查询方式:",
-            "• 使用 n.name CONTAINS '关键词' 进行内容搜索",
-            "• 使用 n.type = '类型名' 进行精确类型过滤",
-            "• 结合 WHERE n.type = '类型' AND n.name CONTAINS '关键词'",
-            "• description字段包含详细内容，适合全文搜索",
-            "• 关系查询使用节点的name和type字段进行定位",
-            "",
-            "现在你可以使用 run_cypher_query 工具基于以上结构信息构造查询！",
-            "="*50
-        ])
+        if not meeting:
+            response = f"在 {max_hops} 跳以内未找到 {source} 与 {target} 之间的连接。"
+            if truncated:
+                response += f"\n⚠️ 搜索已达到展开上限（{MAX_CONNECTION_EXPANSIONS} 个节点）或邻接表被截断，结果可能不完整。"
+            return response
+        
+        paths = []
+        for node_id in meeting:
+            for head in _walk_back(node_id, parents_s, k):
+                for tail in _walk_back(node_id, parents_t, k):
+                    # 终点侧的路径方向相反
+                    steps = head + [(b, e, a) for a, e, b in reversed(tail)]
+                    paths.append(steps)
+                    if len(paths) >= k:
+                        break
+                if len(paths) >= k:
+                    break
+            if len(paths) >= k:
+                break
         
-        return "\n".join(structure_info)
+        response = f"🔍 {source} ({names[source]}) 与 {target} ({names[target]}) 之间的最短连接"
+        response += f"（长度 {len(paths[0])}，共展开 {expanded} 个节点）：\n\n"
+        for i, steps in enumerate(paths, 1):
+            text = f"({steps[0][0]})"
+            for node_from, edge, node_to in steps:
+                # edge记录的是相对于其所属节点的方向，转换为路径行进方向
+                owner = node_from if edge["id"] == node_to else node_to
+                forward = edge["outgoing"] == (owner == node_from)
+                text += f"-[{edge['rel_type']}]->({node_to})" if forward else f"<-[{edge['rel_type']}]-({node_to})"
+            response += f"📍 路径 {i}: {text}\n"
+        
+        involved = {n for steps in paths for a, _, b in steps for n in (a, b)}
+        response += "\n📋 节点信息:\n"
+        for node_id in sorted(involved):
+            response += f"  • {node_id}: {names.get(node_id, '')}\n"
+        if truncated:
+            response += "\n⚠️ 搜索达到展开上限或部分节点邻居过多被截断，可能遗漏其他同等长度的路径。\n"
+        return response
         
     except Exception as e:
-        return f"❌ 获取数据库结构信息失败: {str(e)}\n\n💡 请确保数据库连接正常且包含德国家族企业知识图谱数据。"
+        return f"❌ 查找连接失败: {str(e)}"
+
+@mcp.tool()
+@admission_controlled(PRIORITY_LOW)
+def export_subgraph(filename: str, format: str = "jsonl", ids: Optional[List[str]] = None,
+                    types: Optional[List[str]] = None, root: Optional[str] = None) -> str:
+    """将子图导出到服务器本地文件，供可视化或下游机器学习任务使用
+    
+    结果以流式方式写入，不受 run_cypher_query 的20条记录显示上限限制。
+    ids、types、root 可组合使用（取交集），至少指定一个。
+    
+    Args:
+        filename: 输出文件名（写入服务器的导出目录）
+        format: graphml、jsonl 或 csv（csv会生成 _nodes.csv 和 _relationships.csv）
+        ids: 按节点id选择
+        types: 按节点type选择
+        root: 导出该节点下的整个层次子树（沿CONTAINS/INCLUDES关系）
+    
+    Returns:
+        导出文件路径及节点、关系数量
+    """
+    if format not in EXPORT_FORMATS:
+        return f"错误：不支持的格式 '{format}'，可选: {', '.join(EXPORT_FORMATS)}"
+    if not (ids or types or root):
+        return "错误：请至少指定 ids、types 或 root 中的一个选择条件"
+    
+    # 只保留文件名部分，防止写出导出目录之外
+    name = os.path.basename(filename or "")
+    if not name or name.startswith("."):
+        return "错误：文件名无效"
+    output = os.path.join(MCP_EXPORT_DIR, name)
+    
+    try:
+        selection = SubgraphSelection(ids, types, root, NODE_LABEL)
+        node_count, rel_count = db.run_with_driver(
+            lambda driver: stream_subgraph_to_file(driver, output, format, selection)
+        )
+        return (f"✅ 子图导出完成: {os.path.abspath(output)}\n"
+                f"  • 节点: {node_count:,}\n  • 关系: {rel_count:,}")
+    except Exception as e:
+        return f"❌ 导出子图失败: {str(e)}"
+
+@mcp.tool()
+async def check_server_health() -> str:
+    """检查MCP服务器与Neo4j数据库的健康/就绪状态
+    
+    Returns:
+        数据库连接状态、预热进度、缓存使用情况等信息
+    """
+    try:
+        await asyncio.wait_for(asyncio.to_thread(db.ping), HEALTH_CHECK_TIMEOUT)
+        database_status = "✅ 已连接"
+    except asyncio.TimeoutError:
+        database_status = f"❌ 不可用 (探测超过 {HEALTH_CHECK_TIMEOUT:.0f} 秒未响应)"
+    except Exception as e:
+        database_status = f"❌ 不可用 ({e})"
+    
+    ready = db.is_connected and server_state["warmup"] in ("done", "disabled")
+    warmup = server_state["warmup"]
+    if server_state["warmup_seconds"] is not None:
+        warmup += f" ({server_state['warmup_seconds']:.2f}s)"
+    
+    lines = [
+        f"🩺 服务器状态: {'ready' if ready else 'not ready'}",
+        f"  • 进程: pid {os.getpid()} ({MCP_TRANSPORT}, workers={MCP_WORKERS})",
+        f"  • 运行时间: {time.time() - server_state['started_at']:.0f}s",
+        f"  • Neo4j: {database_status}",
+        f"  • 重连次数: {db.reconnect_count}",
+        f"  • 预热: {warmup}",
+        f"  • Schema说明缓存: {'已就绪' if server_state['schema_description'] else '未生成'}",
+        f"  • 查询缓存: {len(db.cache)} 条 (命中 {db.cache.hits} / 未命中 {db.cache.misses})",
+        f"  • 邻接表缓存: {len(adjacency_cache)} 个节点 "
+        f"(命中 {adjacency_cache.hits} / 未命中 {adjacency_cache.misses})",
+        "  • 共享缓存: " + (
+            f"{db.shared_cache.path} (命中 {db.shared_cache.hits} / 未命中 {db.shared_cache.misses}，"
+            f"本进程生成 {db.shared_cache.builds} 项 / 等待其他worker {db.shared_cache.waits} 项)"
+            if db.shared_cache is not None else "未启用"
+        ),
+        f"  • 请求合并: 实际执行 {db.flights.executions} 次，合并节省 {db.flights.coalesced} 次，"
+        f"进行中 {db.flights.in_flight} 个",
+        f"  • 准入控制: 执行中 {admission.active}/{admission.max_concurrent}，"
+        f"排队 {admission.queue_depth}/{admission.max_queued} (峰值 {admission.max_queue_depth})",
+        f"  • 拒绝统计: 限流 {admission.rejected_rate_limited}，队列已满 {admission.rejected_queue_full}，"
+        f"排队超时 {admission.timed_out}，已准入 {admission.admitted}",
+        f"  • 执行计划缓存命中率(客户端估算，基于 {plan_cache.total} 次实际执行): {plan_cache.hit_rate():.1%} "
+        f"(未参数化时 {plan_cache.hit_rate(raw=True):.1%}，已提取字面量 {plan_cache.literals_lifted} 个)",
+    ]
+    return "\n".join(lines)
+
+def warm_up():
+    """后台预热：建立连接、生成schema说明并缓存常用查询
+    
+    多worker时各项结果只由一个worker生成并写入共享缓存，其他worker等待后直接读取。
+    """
+    server_state["warmup"] = "running"
+    start = time.monotonic()
+    try:
+        db.connect()
+        get_schema_description()
+        for query in HOT_QUERIES:
+            if db.shared_cache is None:
+                db.cached_query(query)
+                continue
+            key = QueryCache.make_key(query)
+            db.cache.set(key, db.shared_cache.get_or_build("query:" + key, lambda: db.run_query(query)))
+        server_state["warmup"] = "done"
+        logger.info("Warm-up finished")
+    except Exception as e:
+        server_state["warmup"] = f"failed: {e}"
+        logger.warning(f"Warm-up failed, caches will be filled on demand: {e}")
+    finally:
+        server_state["warmup_seconds"] = time.monotonic() - start
+
+def init_server():
+    """初始化当前进程：挂载共享缓存、开启轨迹记录并在后台启动预热"""
+    global trace_recorder
+    if MCP_TRACE_FILE and trace_recorder is None:
+        trace_recorder = TraceRecorder(MCP_TRACE_FILE)
+        logger.info(f"Recording tool-call traces to {MCP_TRACE_FILE}")
+    if MCP_SHARED_CACHE and db.shared_cache is None:
+        db.shared_cache = SharedCache(MCP_SHARED_CACHE)
+        logger.info(f"Using shared cache: {MCP_SHARED_CACHE}")
+    # 数据库驱动在首次查询时惰性创建，预热在后台进行，不阻塞服务器启动
+    if WARMUP_ON_START:
+        threading.Thread(target=warm_up, name="neo4j-warmup", daemon=True).start()
+
+def create_app():
+    """多worker模式下由uvicorn在每个worker进程中调用的应用工厂"""
+    global stateless_sessions
+    stateless_sessions = True
+    init_server()
+    # SSE会话绑定在单个进程上，多worker时使用无状态的streamable HTTP
+    return mcp.http_app(transport="streamable-http", stateless_http=True)
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Neo4j知识图谱MCP服务器")
+    parser.add_argument("--host", default=MCP_HOST, help="监听地址")
+    parser.add_argument("--port", type=int, default=MCP_PORT, help="监听端口")
+    parser.add_argument("--transport", choices=["sse", "streamable-http"], default=MCP_TRANSPORT,
+                        help="传输协议")
+    parser.add_argument("--workers", type=int, default=MCP_WORKERS, help="worker进程数")
+    parser.add_argument("--shared-cache", default=MCP_SHARED_CACHE,
+                        help="共享缓存SQLite文件路径（多worker时默认启用）")
+    parser.add_argument("--trace-file", default=MCP_TRACE_FILE,
+                        help="记录工具调用轨迹的JSON Lines文件，供 mcp_load_test.py 回放")
+    return parser.parse_args()
 
 def main():
     """主函数"""
+    global MCP_HOST, MCP_PORT, MCP_TRANSPORT, MCP_WORKERS, MCP_SHARED_CACHE, MCP_TRACE_FILE
+    
+    args = parse_args()
+    MCP_HOST, MCP_PORT, MCP_TRANSPORT, MCP_WORKERS = args.host, args.port, args.transport, args.workers
+    MCP_TRACE_FILE = args.trace_file
+    MCP_SHARED_CACHE = args.shared_cache or (DEFAULT_SHARED_CACHE if MCP_WORKERS > 1 else "")
+    
     try:
-        # 连接数据库
-        db.connect()
+        if MCP_WORKERS > 1:
+            import uvicorn
+            
+            if MCP_TRANSPORT == "sse":
+                logger.warning("SSE sessions cannot be shared across workers, using streamable-http")
+                MCP_TRANSPORT = "streamable-http"
+            # worker进程重新导入本模块，通过环境变量传递配置
+            os.environ.update({
+                "MCP_TRANSPORT": MCP_TRANSPORT,
+                "MCP_WORKERS": str(MCP_WORKERS),
+                "MCP_SHARED_CACHE": MCP_SHARED_CACHE,
+                "MCP_TRACE_FILE": MCP_TRACE_FILE,
+            })
+            logger.info(f"Starting Neo4j MCP Server on http://{MCP_HOST}:{MCP_PORT}/mcp "
+                        f"with {MCP_WORKERS} workers")
+            uvicorn.run("neo4j_mcp_server:create_app", factory=True,
+                        host=MCP_HOST, port=MCP_PORT, workers=MCP_WORKERS)
+            return
+        
+        init_server()
         logger.info("Neo4j MCP Server initialized successfully")
         
-        # 使用FastMCP 2.0的方式运行SSE服务器
-        logger.info("Starting Neo4j MCP Server on http://127.0.0.1:8000")
-        mcp.run(transport="sse", host="127.0.0.1", port=8000)
+        logger.info(f"Starting Neo4j MCP Server on http://{MCP_HOST}:{MCP_PORT} ({MCP_TRANSPORT})")
+        mcp.run(transport=MCP_TRANSPORT, host=MCP_HOST, port=MCP_PORT)
         
     except KeyboardInterrupt:
         logger.info("Server stopped by user")
@@ -380,4 +2003,4 @@ def main():
         db.close()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能统计公用定义
+导入器的性能报告、MCP服务器的调用轨迹与压测报告共用
+"""
+
+import math
+from typing import List
+
+# 工具返回文本以这些前缀开头时视为调用失败（错误、被准入控制拒绝）
+TOOL_ERROR_PREFIXES = ("❌", "⏳", "错误")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩法计算百分位数：返回第 ceil(pct/100 * n) 小的值"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # 先舍入，避免 0.07 * 100 = 7.000000000000001 这类浮点误差使秩多进一位
+    rank = max(math.ceil(round(pct / 100 * len(ordered), 9)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
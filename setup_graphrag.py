@@ -6,13 +6,169 @@ Microsoft GraphRAG 设置脚本
 """
 
 import os
+import re
 import shutil
+import hashlib
 import logging
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 预处理分块配置（与settings.yaml中的chunks配置保持一致）
+CHUNK_SIZE = 1200
+CHUNK_OVERLAP = 100
+
+# MinHash近似去重配置
+MINHASH_NUM_PERM = 64
+MINHASH_BANDS = 16
+SHINGLE_SIZE = 5
+DEDUP_THRESHOLD = 0.85
+
+# CJK字符各计为一个token，连续的字母数字计为一个token，其余非空白符号各计为一个token
+_TOKEN_PATTERN = re.compile(
+    r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3040-\u30ff\uac00-\ud7af]'
+    r'|[0-9A-Za-z\u00c0-\u024f]+'
+    r'|[^\s]'
+)
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _minhash_coefficients(num_perm: int) -> List[Tuple[int, int]]:
+    """生成确定性的MinHash置换系数，保证多进程间签名一致"""
+    coefficients = []
+    for i in range(num_perm):
+        digest = hashlib.sha1(f"minhash-{i}".encode('utf-8')).digest()
+        a = int.from_bytes(digest[:8], 'little') % _MERSENNE_PRIME or 1
+        b = int.from_bytes(digest[8:16], 'little') % _MERSENNE_PRIME
+        coefficients.append((a, b))
+    return coefficients
+
+
+def normalize_line(line: str) -> str:
+    """规范化单行文本：NFKC全半角统一、去除控制字符、压缩空白"""
+    line = unicodedata.normalize('NFKC', line)
+    line = ''.join(ch for ch in line if ch in '\t ' or unicodedata.category(ch)[0] != 'C')
+    return re.sub(r'[ \t\u3000]+', ' ', line).strip()
+
+
+def minhash_signature(text: str, coefficients: List[Tuple[int, int]]) -> Tuple[int, ...]:
+    """基于字符shingle计算MinHash签名（对中文无需分词）"""
+    compact = re.sub(r'\s+', '', text)
+    if len(compact) <= SHINGLE_SIZE:
+        shingles = {compact}
+    else:
+        shingles = {compact[i:i + SHINGLE_SIZE] for i in range(len(compact) - SHINGLE_SIZE + 1)}
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little')
+        for s in shingles
+    ]
+    return tuple(
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in coefficients
+    )
+
+
+def chunk_document(file_path: str, normalized_path: str, chunk_size: int = CHUNK_SIZE,
+                   overlap: int = CHUNK_OVERLAP, num_perm: int = MINHASH_NUM_PERM) -> List[Dict]:
+    """
+    逐行读取并规范化单个文档，按CJK感知的token数切分
+
+    该函数在进程池中执行，因此必须定义在模块顶层。
+    规范化后的全文写入 normalized_path，只把分块元数据（字符区间、签名）返回给主进程。
+
+    Returns:
+        分块元数据列表，char_start/char_end 为规范化文本中的字符偏移
+    """
+    lines = []
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        for raw_line in f:
+            line = normalize_line(raw_line)
+            if line:
+                lines.append(line)
+    text = '\n'.join(lines)
+    # newline=''：不做换行符转换，保证文件内容与字符偏移一一对应
+    with open(normalized_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+
+    spans = [m.span() for m in _TOKEN_PATTERN.finditer(text)]
+    coefficients = _minhash_coefficients(num_perm)
+    step = max(chunk_size - overlap, 1)
+    doc_name = Path(file_path).name
+
+    chunks = []
+    for index, start in enumerate(range(0, max(len(spans), 1), step)):
+        window = spans[start:start + chunk_size]
+        if not window:
+            break
+        char_start, char_end = window[0][0], window[-1][1]
+        chunk_text = text[char_start:char_end]
+        chunks.append({
+            'chunk_id': hashlib.sha1(f"{doc_name}:{index}".encode('utf-8')).hexdigest()[:16],
+            'document': doc_name,
+            'chunk_index': index,
+            'char_start': char_start,
+            'char_end': char_end,
+            'n_tokens': len(window),
+            'content_hash': hashlib.sha1(chunk_text.encode('utf-8')).hexdigest()[:16],
+            'signature': minhash_signature(chunk_text, coefficients),
+        })
+        if start + chunk_size >= len(spans):
+            break
+
+    return chunks
+
+
+def _estimate_jaccard(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+    """由MinHash签名估计Jaccard相似度"""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+def deduplicate_chunks(chunks: List[Dict], threshold: float = DEDUP_THRESHOLD,
+                       bands: int = MINHASH_BANDS) -> List[Dict]:
+    """
+    使用MinHash + LSH分桶标记近似重复的分块
+
+    每个分块会被写入 duplicate_of 字段：保留的分块为None，重复分块为首次出现的chunk_id。
+    """
+    buckets: Dict[Tuple, List[Dict]] = {}
+    for chunk in chunks:
+        signature = chunk['signature']
+        rows = max(len(signature) // bands, 1)
+        keys = [(band, signature[band * rows:(band + 1) * rows]) for band in range(bands)]
+
+        duplicate_of = None
+        for key in keys:
+            for candidate in buckets.get(key, []):
+                if (candidate['content_hash'] == chunk['content_hash']
+                        or _estimate_jaccard(candidate['signature'], signature) >= threshold):
+                    duplicate_of = candidate['chunk_id']
+                    break
+            if duplicate_of:
+                break
+
+        chunk['duplicate_of'] = duplicate_of
+        if duplicate_of is None:
+            for key in keys:
+                buckets.setdefault(key, []).append(chunk)
+
+    return chunks
+
+
+def _merge_spans(spans: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """合并重叠的字符区间"""
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
 class GraphRAGSetup:
     def __init__(self, project_name="german_family_business"):
         self.project_name = project_name
@@ -54,6 +210,112 @@ class GraphRAGSetup:
             
         logger.info(f"共复制了 {len(txt_files)} 个文档文件")
         
+    def preprocess_documents(self, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP,
+                             threshold: float = DEDUP_THRESHOLD, max_workers: Optional[int] = None):
+        """
+        本地预处理input目录：规范化、分块并去除近似重复内容
+
+        在GraphRAG调用付费的实体抽取之前执行，减少需要处理的文本量。
+        文档会被改写为仅包含非重复分块的文本；规范化后的全文保存在 output/preprocess/normalized/，
+        分块元数据写入 output/preprocess/chunks.parquet：
+        char_start/char_end 指向规范化全文，output_start/output_end 指向改写后的文档（重复分块为-1）。
+        
+        Args:
+            chunk_size: 每个分块的token数
+            overlap: 相邻分块重叠的token数
+            threshold: 判定为近似重复的Jaccard相似度阈值
+            max_workers: 进程池大小，默认为CPU核数
+        """
+        logger.info("预处理文档：规范化、分块、近似去重...")
+        
+        txt_files = sorted(self.input_dir.glob("*.txt"))
+        if not txt_files:
+            logger.warning(f"input目录中没有文档，跳过预处理: {self.input_dir}")
+            return
+        
+        normalized_dir = self.project_dir / "output" / "preprocess" / "normalized"
+        normalized_dir.mkdir(parents=True, exist_ok=True)
+        normalized_files = [normalized_dir / p.name for p in txt_files]
+        
+        all_chunks = []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(
+                chunk_document, [str(p) for p in txt_files], [str(p) for p in normalized_files],
+                [chunk_size] * len(txt_files), [overlap] * len(txt_files)
+            )
+            for chunks in results:
+                all_chunks.extend(chunks)
+        
+        deduplicate_chunks(all_chunks, threshold)
+        
+        # 用保留分块覆盖的区间改写文档（逐个文档读取规范化全文）
+        original_chars = 0
+        kept_chars = 0
+        for txt_file, normalized_file in zip(txt_files, normalized_files):
+            chunks = [c for c in all_chunks if c['document'] == txt_file.name]
+            with open(normalized_file, 'r', encoding='utf-8', newline='') as f:
+                text = f.read()
+            kept_text = self._rewrite_offsets(text, chunks)
+            original_chars += txt_file.stat().st_size
+            kept_chars += len(kept_text.encode('utf-8'))
+            with open(txt_file, 'w', encoding='utf-8', newline='') as f:
+                f.write(kept_text)
+        
+        self._write_chunk_metadata(all_chunks)
+        
+        duplicates = sum(1 for c in all_chunks if c['duplicate_of'] is not None)
+        logger.info(f"共生成 {len(all_chunks)} 个分块，去除近似重复分块 {duplicates} 个")
+        if original_chars:
+            logger.info(f"文本量: {original_chars:,} -> {kept_chars:,} 字节 "
+                        f"({kept_chars / original_chars:.1%})")
+        
+    @staticmethod
+    def _rewrite_offsets(text: str, chunks: List[Dict]) -> str:
+        """
+        拼接单个文档中保留分块覆盖的区间，并为每个分块写入其在改写后文本中的位置
+
+        Returns:
+            改写后的文档文本
+        """
+        merged = _merge_spans([(c['char_start'], c['char_end']) for c in chunks if c['duplicate_of'] is None])
+        # 每个合并区间在改写后文本中的起点（区间之间以换行分隔）
+        output_starts = []
+        position = 0
+        for start, end in merged:
+            output_starts.append(position)
+            position += end - start + 1
+        
+        for chunk in chunks:
+            chunk['output_start'] = chunk['output_end'] = -1
+            if chunk['duplicate_of'] is not None:
+                continue
+            for (start, end), output_start in zip(merged, output_starts):
+                if start <= chunk['char_start'] and chunk['char_end'] <= end:
+                    chunk['output_start'] = output_start + chunk['char_start'] - start
+                    chunk['output_end'] = output_start + chunk['char_end'] - start
+                    break
+        
+        return '\n'.join(text[start:end] for start, end in merged)
+        
+    def _write_chunk_metadata(self, chunks: List[Dict]):
+        """将分块元数据写入紧凑的parquet文件"""
+        import pandas as pd
+        
+        metadata_dir = self.project_dir / "output" / "preprocess"
+        metadata_dir.mkdir(parents=True, exist_ok=True)
+        metadata_file = metadata_dir / "chunks.parquet"
+        
+        df = pd.DataFrame([
+            {k: v for k, v in chunk.items() if k != 'signature'} for chunk in chunks
+        ])
+        if not df.empty:
+            for column in ('chunk_index', 'char_start', 'char_end', 'output_start', 'output_end', 'n_tokens'):
+                df[column] = df[column].astype('int32')
+            df['document'] = df['document'].astype('category')
+        df.to_parquet(metadata_file, index=False, compression='zstd')
+        
+        logger.info(f"分块元数据已写入: {metadata_file}")
+        
     def create_settings_yaml(self):
         """创建GraphRAG配置文件"""
         logger.info("创建GraphRAG配置文件...")
@@ -331,6 +593,7 @@ if __name__ == "__main__":
         
         self.create_project_structure()
         self.copy_documents()
+        self.preprocess_documents()
         self.create_settings_yaml()
         self.create_env_template()
         self.create_installation_script()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MCP服务器检查
+- 并发行为：使用模拟的Neo4j驱动（每次查询固定耗时），通过FastMCP内存传输并发调用工具
+- 查询改写：字面量参数化与节点返回投影
+"""
+
+import time
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("fastmcp")
+pytest.importorskip("neo4j")
+
+from fastmcp import Client
+
+import neo4j_mcp_server as server
+
+QUERY_DELAY = 0.3
+
+
+class _Record:
+    def __init__(self, data):
+        self._data = data
+
+    def data(self):
+        return dict(self._data)
+
+
+class SlowDriver:
+    """每次 session.run 休眠 QUERY_DELAY 秒并记录执行次数"""
+
+    def __init__(self):
+        self.runs = 0
+        self._lock = threading.Lock()
+
+    def session(self, **kwargs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, parameters=None, **kwargs):
+        with self._lock:
+            self.runs += 1
+        time.sleep(QUERY_DELAY)
+        return [_Record({"value": 1})]
+
+    def verify_connectivity(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def driver(monkeypatch):
+    driver = SlowDriver()
+    monkeypatch.setattr(server.db, "driver", driver)
+    monkeypatch.setattr(server.db, "flights", server.SingleFlight())
+    monkeypatch.setattr(server.db, "cache", server.QueryCache())
+    monkeypatch.setattr(server.db, "shared_cache", None)
+    monkeypatch.setattr(server, "admission", server.AdmissionController())
+    return driver
+
+
+def _call_concurrently(queries):
+    async def run():
+        async with Client(server.mcp) as client:
+            start = time.perf_counter()
+            await asyncio.gather(*(client.call_tool("run_cypher_query", {"query": q}) for q in queries))
+            return time.perf_counter() - start
+    return asyncio.run(run())
+
+
+def test_identical_in_flight_calls_share_one_execution(driver):
+    elapsed = _call_concurrently(["MATCH (n) RETURN n.value AS value"] * 2)
+
+    assert driver.runs == 1
+    assert server.db.flights.executions == 1
+    assert server.db.flights.coalesced == 1
+    assert elapsed < 2 * QUERY_DELAY
+
+
+def test_distinct_calls_run_concurrently(driver):
+    elapsed = _call_concurrently([f"MATCH (n) RETURN n.value AS v{i}" for i in range(4)])
+
+    assert driver.runs == 4
+    assert server.db.flights.coalesced == 0
+    assert elapsed < 2 * QUERY_DELAY
+
+
+@pytest.mark.parametrize("query, expected_query, expected_parameters", [
+    # 比较运算、字符串谓词
+    ("MATCH (n) WHERE n.name = 'x' RETURN n.name",
+     "MATCH (n) WHERE n.name = $lit_0 RETURN n.name", {"lit_0": "x"}),
+    ("MATCH (n) WHERE n.name STARTS WITH 'De' AND n.description CONTAINS 'y' RETURN n.name",
+     "MATCH (n) WHERE n.name STARTS WITH $lit_0 AND n.description CONTAINS $lit_1 RETURN n.name",
+     {"lit_0": "De", "lit_1": "y"}),
+    # IN 列表：只提取第一层元素
+    ("MATCH (n) WHERE n.type IN ['a', 'b'] RETURN n.name",
+     "MATCH (n) WHERE n.type IN [$lit_0, $lit_1] RETURN n.name", {"lit_0": "a", "lit_1": "b"}),
+    ("MATCH (n) WHERE n.id IN [1, [2, 3]] RETURN n.name",
+     "MATCH (n) WHERE n.id IN [$lit_0, [2, 3]] RETURN n.name", {"lit_0": 1}),
+    # 属性映射
+    ("MATCH (n {type: 'x'}) RETURN n.name",
+     "MATCH (n {type: $lit_0}) RETURN n.name", {"lit_0": "x"}),
+    # RETURN 中的字面量决定列名，保持不变；RETURN 内的映射值仍可提取
+    ("MATCH (n) RETURN 'x' AS label, 1 AS one, n.x + 1 AS y",
+     "MATCH (n) RETURN 'x' AS label, 1 AS one, n.x + 1 AS y", {}),
+    ("MATCH (n) RETURN n {.name, score: 1} AS m",
+     "MATCH (n) RETURN n {.name, score: $lit_0} AS m", {"lit_0": 1}),
+    # CASE 表达式不改写
+    ("MATCH (n) RETURN CASE WHEN n.x = 1 THEN 'a' ELSE 'b' END AS c",
+     "MATCH (n) RETURN CASE WHEN n.x = 1 THEN 'a' ELSE 'b' END AS c", {}),
+    ("MATCH (n) WHERE CASE n.type WHEN 'a' THEN true ELSE false END RETURN n.name",
+     "MATCH (n) WHERE CASE n.type WHEN 'a' THEN true ELSE false END RETURN n.name", {}),
+    # LIMIT/SKIP 只提取整数
+    ("MATCH (n) RETURN n.name ORDER BY n.name SKIP 10 LIMIT 5",
+     "MATCH (n) RETURN n.name ORDER BY n.name SKIP $lit_0 LIMIT $lit_1", {"lit_0": 10, "lit_1": 5}),
+    # 相同字面量复用参数，1 与 1.0 类型不同，分别提取
+    ("MATCH (n) WHERE n.a = 1 AND n.b = 1.0 AND n.c = 1 RETURN n.name",
+     "MATCH (n) WHERE n.a = $lit_0 AND n.b = $lit_1 AND n.c = $lit_0 RETURN n.name",
+     {"lit_0": 1, "lit_1": 1.0}),
+    # UNION 与 CALL 子查询中的条件同样提取
+    ("MATCH (n) WHERE n.a = 1 RETURN n.name UNION MATCH (n) WHERE n.a = 2 RETURN n.name",
+     "MATCH (n) WHERE n.a = $lit_0 RETURN n.name UNION MATCH (n) WHERE n.a = $lit_1 RETURN n.name",
+     {"lit_0": 1, "lit_1": 2}),
+    ("CALL { MATCH (n) WHERE n.a = 1 RETURN n } RETURN n.name",
+     "CALL { MATCH (n) WHERE n.a = $lit_0 RETURN n } RETURN n.name", {"lit_0": 1}),
+    # 已有参数名不冲突，WITH 中的字面量不改写
+    ("MATCH (n) WITH n, 5 AS k WHERE n.x > 1 AND n.name = $lit_0 RETURN n.name",
+     "MATCH (n) WITH n, 5 AS k WHERE n.x > $_lit_0 AND n.name = $lit_0 RETURN n.name",
+     {"lit_0": "given", "_lit_0": 1}),
+])
+def test_parameterize_literals(query, expected_query, expected_parameters):
+    given = {"lit_0": "given"} if "$lit_0" in query else None
+    rewritten, parameters, lifted = server.parameterize_literals(query, given)
+
+    assert rewritten == expected_query
+    assert parameters == expected_parameters
+    assert [type(v) for v in parameters.values()] == [type(v) for v in expected_parameters.values()]
+    assert lifted == expected_query.count("$") - query.count("$")
+
+
+def _projected(var, alias=None):
+    return (f"{var} {{.id, .name, .type, description_preview: left({var}.description, "
+            f"{server.DESCRIPTION_PREVIEW_LENGTH})}} AS {alias or var}")
+
+
+@pytest.mark.parametrize("query, expected_query", [
+    ("MATCH (n:Node) RETURN n", f"MATCH (n:Node) RETURN {_projected('n')}"),
+    ("MATCH (n:Node) RETURN n AS node", f"MATCH (n:Node) RETURN {_projected('n', 'node')}"),
+    ("MATCH (n:Node) RETURN DISTINCT n", f"MATCH (n:Node) RETURN DISTINCT {_projected('n')}"),
+    ("MATCH (n:Node) RETURN n SKIP 2 LIMIT 3", f"MATCH (n:Node) RETURN {_projected('n')} SKIP 2 LIMIT 3"),
+    ("MATCH (a)-[r]->(b) RETURN a, r, b", f"MATCH (a)-[r]->(b) RETURN {_projected('a')}, r, {_projected('b')}"),
+    ("MATCH (n:A) RETURN n, n.description AS d", f"MATCH (n:A) RETURN {_projected('n')}, n.description AS d"),
+    # ORDER BY 只使用投影字段时可以投影
+    ("MATCH (n:Node) RETURN n ORDER BY n.name", f"MATCH (n:Node) RETURN {_projected('n')} ORDER BY n.name"),
+    ("MATCH (n:Node) RETURN n AS m ORDER BY m.name", f"MATCH (n:Node) RETURN {_projected('n', 'm')} ORDER BY m.name"),
+    # ORDER BY 使用投影之外的字段或节点函数时保持原样
+    ("MATCH (n:Node) RETURN n ORDER BY n.description", "MATCH (n:Node) RETURN n ORDER BY n.description"),
+    ("MATCH (n:Node) RETURN n ORDER BY id(n)", "MATCH (n:Node) RETURN n ORDER BY id(n)"),
+    ("MATCH (n:Node) RETURN n AS m ORDER BY m.description", "MATCH (n:Node) RETURN n AS m ORDER BY m.description"),
+    # UNION 各分支的返回列保持一致
+    ("MATCH (n:A) RETURN n UNION MATCH (n:B) RETURN n",
+     f"MATCH (n:A) RETURN {_projected('n')} UNION MATCH (n:B) RETURN {_projected('n')}"),
+    ("MATCH (n:A) RETURN n ORDER BY n.description UNION MATCH (n:B) RETURN n",
+     "MATCH (n:A) RETURN n ORDER BY n.description UNION MATCH (n:B) RETURN n"),
+    # CALL 子查询内部的 RETURN 不改写，只改写最外层
+    ("CALL { MATCH (n:A) RETURN n } RETURN n", f"CALL {{ MATCH (n:A) RETURN n }} RETURN {_projected('n')}"),
+    ("MATCH (n:A) CALL { WITH n MATCH (n)-->(m) RETURN m } RETURN n, m",
+     f"MATCH (n:A) CALL {{ WITH n MATCH (n)-->(m) RETURN m }} RETURN {_projected('n')}, {_projected('m')}"),
+    # 非节点返回项不改写
+    ("MATCH (n:Node) RETURN n.name", "MATCH (n:Node) RETURN n.name"),
+    ("MATCH (n:A) RETURN count(n)", "MATCH (n:A) RETURN count(n)"),
+    ("MATCH p=(n:A)-->() RETURN p", "MATCH p=(n:A)-->() RETURN p"),
+])
+def test_project_node_returns(query, expected_query):
+    rewritten, projected = server.project_node_returns(query)
+
+    assert rewritten == expected_query
+    assert projected == expected_query.count("description_preview")